@@ -0,0 +1,6 @@
+"""
+ASGI entry point used to serve the API with hypercorn.
+"""
+from src.api.app import app
+
+__all__ = ["app"]
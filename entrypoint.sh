@@ -7,7 +7,7 @@ mkdir -p /app/chroma_db
 # Check execution mode
 if [ "$1" = "flask" ] || [ "$1" = "api" ]; then
     echo "Starting Flask API server..."
-    python /app/src/api/app.py
+    hypercorn asgi:app --workers 1 --bind 0.0.0.0:${FLASK_PORT:-5000}
 elif [ "$1" = "streamlit" ] || [ "$1" = "web" ]; then
     echo "Starting Streamlit web interface..."
     streamlit run /app/src/web/streamlit_app.py --server.port=8501 --server.address=0.0.0.0
@@ -20,6 +20,6 @@ elif [ -n "$1" ]; then
 else
     # Default behavior: start both services in parallel
     echo "Starting all services..."
-    python /app/src/api/app.py &
+    hypercorn asgi:app --workers 1 --bind 0.0.0.0:${FLASK_PORT:-5000} &
     streamlit run /app/src/web/streamlit_app.py --server.port=8501 --server.address=0.0.0.0
 fi
\ No newline at end of file
@@ -5,16 +5,22 @@ Script to run the application components locally.
 import os
 import sys
 import argparse
+import asyncio
+import functools
 import subprocess
 import threading
 import time
 from pathlib import Path
 
-# Add the root directory to the Python PATH
-current_dir = Path(os.path.dirname(os.path.realpath(__file__)))
-if str(current_dir) not in sys.path:
-    sys.path.insert(0, str(current_dir))
+# Project root, where the launcher lives
+current_dir = Path(__file__).resolve().parent
 
+# Local data locations, resolved once
+DATA_DIR_STR = str(current_dir / "data")
+DB_PATH_STR = str(current_dir / "data" / "chat.db")
+VECTOR_STORE_DIR_STR = str(current_dir / "chroma_db")
+
+@functools.lru_cache(maxsize=None)
 def debug_paths():
     """Displays diagnostic information about paths used."""
     from src.config.settings import DB_PATH, VECTOR_STORE_DIR
@@ -30,18 +36,30 @@ def debug_paths():
     print(f"VECTOR_STORE_DIR exists: {os.path.exists(VECTOR_STORE_DIR)}")
     print("================================")
 
+def use_local_paths():
+    """
+    Points the application at the local data directories.
+    
+    The API and the chatbot run in this interpreter, so the paths must be set
+    before anything imports the settings module.
+    """
+    os.environ["DB_PATH"] = DB_PATH_STR
+    os.environ["VECTOR_STORE_DIR"] = VECTOR_STORE_DIR_STR
+    
+    print(f"DB_PATH set to: {DB_PATH_STR}")
+    print(f"VECTOR_STORE_DIR set to: {VECTOR_STORE_DIR_STR}")
+
+@functools.lru_cache(maxsize=None)
 def ensure_directories():
     """Ensures necessary directories exist."""
     print("Checking and creating necessary directories...")
     # Create directory for SQLite database
-    data_dir = os.path.join(str(current_dir), "data")
-    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(DATA_DIR_STR, exist_ok=True)
     
     # Create directory for ChromaDB
-    chroma_dir = os.path.join(str(current_dir), "chroma_db")
-    os.makedirs(chroma_dir, exist_ok=True)
+    os.makedirs(VECTOR_STORE_DIR_STR, exist_ok=True)
     
-    print(f"Directories created/verified: {data_dir}, {chroma_dir}")
+    print(f"Directories created/verified: {DATA_DIR_STR}, {VECTOR_STORE_DIR_STR}")
 
 def run_flask():
     """Runs the Flask server."""
@@ -49,20 +67,21 @@ def run_flask():
     
     # Configure environment variables with absolute paths
     os.environ["FLASK_PORT"] = "5000"
-    os.environ["FLASK_DEBUG"] = "True"
+    os.environ["FLASK_DEBUG"] = "False"
     
-    # Use explicit paths
-    db_path = os.path.join(str(current_dir), "data", "chat.db")
-    vector_store_dir = os.path.join(str(current_dir), "chroma_db")
-    os.environ["DB_PATH"] = db_path
-    os.environ["VECTOR_STORE_DIR"] = vector_store_dir
+    # Import the app in this interpreter instead of booting a new one
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    from src.api.app import app
     
-    print(f"DB_PATH set to: {db_path}")
-    print(f"VECTOR_STORE_DIR set to: {vector_store_dir}")
+    # Serve the ASGI app with hypercorn; a single event loop multiplexes
+    # every in-flight OpenAI request, so one worker is enough
+    config = Config()
+    config.bind = [f"0.0.0.0:{os.environ['FLASK_PORT']}"]
     
-    # Run Flask in debug mode to see detailed error messages
-    flask_script = os.path.join(str(current_dir), "src", "api", "app.py")
-    subprocess.run([sys.executable, flask_script], check=True)
+    # Signal handlers can only be installed from the main thread, and run_all
+    # serves the API from a background thread
+    asyncio.run(serve(app, config, shutdown_trigger=lambda: asyncio.Future()))
 
 def run_streamlit():
     """Runs the Streamlit interface."""
@@ -79,31 +98,43 @@ def run_streamlit():
 def run_chatbot():
     """Runs the chatbot in console mode."""
     print("Starting chatbot in console mode")
-    main_script = os.path.join(str(current_dir), "main.py")
-    
-    # Use explicit paths
-    db_path = os.path.join(str(current_dir), "data", "chat.db")
-    vector_store_dir = os.path.join(str(current_dir), "chroma_db")
-    os.environ["DB_PATH"] = db_path
-    os.environ["VECTOR_STORE_DIR"] = vector_store_dir
-    
-    subprocess.run([sys.executable, main_script], check=True)
+    from src.chatbot.agent import chat
+    chat()
+
+def wait_for_api(health_url, attempts=50, interval=0.1):
+    """
+    Polls the API health endpoint until it responds.
+    
+    Args:
+        health_url: URL of the health check endpoint
+        attempts: Maximum number of polls
+        interval: Seconds to wait between polls
+        
+    Returns:
+        True if the API became ready, False if it never answered
+    """
+    import requests
+    
+    for _ in range(attempts):
+        try:
+            if requests.get(health_url, timeout=0.2).ok:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(interval)
+    
+    print(f"API did not answer at {health_url}; starting the interface anyway")
+    return False
 
 def run_all():
     """Runs all components."""
-    # Display diagnostic information
-    debug_paths()
-    
-    # Ensure directories exist
-    ensure_directories()
-    
     # Start Flask API in a separate thread
     flask_thread = threading.Thread(target=run_flask)
     flask_thread.daemon = True
     flask_thread.start()
     
-    # Wait a moment for the API to start
-    time.sleep(2)
+    # Wait until the API answers its health check
+    wait_for_api("http://localhost:5000/health")
     
     # Start Streamlit
     run_streamlit()
@@ -116,6 +147,9 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
+    # Configure the data paths before the settings module is imported
+    use_local_paths()
+    
     # Display diagnostic information
     debug_paths()
     
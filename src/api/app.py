@@ -1,47 +1,102 @@
 """
-Flask API to interact with the LangGraph chatbot.
+Async API to interact with the LangGraph chatbot.
+
+Built with Quart, which keeps the Flask API but runs views on an event loop,
+so a single process can wait on many OpenAI requests at once.
 """
 import os
-import sys
-import json
-from pathlib import Path
-from flask import Flask, request, jsonify
-
-# Add the root directory to the Python PATH
-current_dir = Path(os.path.dirname(os.path.realpath(__file__)))
-root_dir = current_dir.parent.parent
-if str(root_dir) not in sys.path:
-    sys.path.insert(0, str(root_dir))
+import orjson
+from flask.json.provider import JSONProvider
+from quart import Quart, request, jsonify, make_response
 
 from src.config.settings import DB_PATH
-from src.chatbot.agent import graph_with_memory
+from src.chatbot.agent import create_graph_with_memory, warm_up_vector_store
 from langchain_core.messages import HumanMessage
 
 # Ensure the database directory exists
 db_dir = os.path.dirname(DB_PATH)
 os.makedirs(db_dir, exist_ok=True)
 
-app = Flask(__name__)
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson, used by jsonify and request.get_json."""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode("utf-8")
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app = Quart(__name__)
+app.json = OrjsonProvider(app)
+
+# Compiled on startup, since its checkpointer must live on the serving event loop
+graph_with_memory = None
+
+@app.before_serving
+async def open_graph():
+    """Compiles the graph with its persistent checkpointer."""
+    global graph_with_memory
+    warm_up_vector_store()
+    graph_with_memory = await create_graph_with_memory()
+
+@app.after_serving
+async def close_graph():
+    """Closes the checkpointer database connection."""
+    await graph_with_memory.checkpointer.conn.close()
 
 @app.route("/health", methods=["GET"])
-def health_check():
+async def health_check():
     """Endpoint to check if the API is running."""
     return jsonify({"status": "ok", "message": "Chatbot API is running"}), 200
 
-@app.route("/chat", methods=["POST"])
-def chat():
+def build_response(user_message, output, thread_id):
     """
-    Endpoint to send messages to the chatbot and receive responses.
+    Builds the response payload returned to the client for one chat turn.
     
-    Expects a JSON with the following format:
-    {
-        "message": "User's message",
-        "thread_id": "Conversation ID (optional)"
+    Args:
+        user_message: Message sent by the user
+        output: Final graph state for this turn
+        thread_id: Conversation ID
+        
+    Returns:
+        Dictionary with the user message, the AI response and the thread ID
+    """
+    # Extract the content of the response messages
+    response_messages = []
+    
+    # Add the current user message at the beginning of the response
+    response_messages.append({
+        "content": user_message,
+        "type": "human"
+    })
+    
+    # Add only the AI response message (last message)
+    if output and "messages" in output and len(output["messages"]) > 0:
+        # The last message is the AI's response to this input
+        last_message = output["messages"][-1]
+        response_messages.append({
+            "content": last_message.content,
+            "type": last_message.type
+        })
+    
+    return {
+        "response": response_messages,
+        "thread_id": thread_id
     }
+
+def parse_chat_request(data):
+    """
+    Validates a chat request body and prepares the graph input.
+    
+    Args:
+        data: Parsed JSON body of the request
+        
+    Returns:
+        Tuple (user_message, thread_id, graph_input, config), or None if the
+        message is missing
     """
-    data = request.json
     if not data or "message" not in data:
-        return jsonify({"error": "Message is required"}), 400
+        return None
     
     user_message = data["message"]
     thread_id = data.get("thread_id", "20")  # Use "20" as the default ID if not provided
@@ -49,46 +104,88 @@ def chat():
     # Configure the conversation identifier
     config = {"configurable": {"thread_id": thread_id}}
     
-    # Create user message and invoke the graph
-    messages = [HumanMessage(content=user_message)]
+    # Create user message to invoke the graph
+    graph_input = {"messages": [HumanMessage(content=user_message)]}
+    
+    return user_message, thread_id, graph_input, config
+
+@app.route("/chat", methods=["POST"])
+async def chat():
+    """
+    Endpoint to send messages to the chatbot and receive responses.
+    
+    Expects a JSON with the following format:
+    {
+        "message": "User's message",
+        "thread_id": "Conversation ID (optional)"
+    }
+    """
+    parsed = parse_chat_request(await request.get_json())
+    if parsed is None:
+        return jsonify({"error": "Message is required"}), 400
+    
+    user_message, thread_id, graph_input, config = parsed
     
     try:
-        output = graph_with_memory.invoke({"messages": messages}, config)
-        app.logger.info(f"Output type: {type(output)}")
-        app.logger.info(f"Output content: {output}")
+        output = await graph_with_memory.ainvoke(graph_input, config)
+        app.logger.debug("Output type: %s", type(output))
         
-        # Extract the content of the response messages
-        response_messages = []
+        response_data = build_response(user_message, output, thread_id)
         
-        # Add the current user message at the beginning of the response
-        response_messages.append({
-            "content": user_message,
-            "type": "human"
-        })
-        
-        # Add only the AI response message (last message)
-        if output and "messages" in output and len(output["messages"]) > 0:
-            # The last message is the AI's response to this input
-            last_message = output["messages"][-1]
-            response_messages.append({
-                "content": last_message.content,
-                "type": last_message.type
-            })
-        
-        response_data = {
-            "response": response_messages,
-            "thread_id": thread_id
-        }
-        
-        app.logger.info(f"Final response: {json.dumps(response_data)}")
+        app.logger.debug("Final response: %d messages, thread=%s",
+                         len(response_data["response"]), thread_id)
         return jsonify(response_data)
     
     except Exception as e:
         app.logger.error(f"Error processing message: {str(e)}")
         return jsonify({"error": f"Error processing your message: {str(e)}"}), 500
 
-if __name__ == "__main__":
-    port = int(os.environ.get("FLASK_PORT", 5000))
-    debug = os.environ.get("FLASK_DEBUG", "False").lower() == "true"
+def format_event(payload):
+    """Formats a payload as a server-sent event."""
+    return f"data: {app.json.dumps(payload)}\n\n"
+
+@app.route("/chat/stream", methods=["POST"])
+async def chat_stream():
+    """
+    Streams the chatbot response as server-sent events.
+    
+    Accepts the same JSON body as /chat. Each "token" event carries a piece of
+    the assistant's answer as soon as the model generates it, and the final
+    "done" event carries the same payload /chat would return. Failures after
+    the stream has started are reported as an "error" event.
+    """
+    parsed = parse_chat_request(await request.get_json())
+    if parsed is None:
+        return jsonify({"error": "Message is required"}), 400
+    
+    user_message, thread_id, graph_input, config = parsed
+    
+    async def events():
+        output = None
+        try:
+            async for mode, payload in graph_with_memory.astream(
+                graph_input, config, stream_mode=["messages", "values"]
+            ):
+                if mode == "values":
+                    # Keep the latest full state to build the final payload
+                    output = payload
+                    continue
+                
+                # Forward only the answer tokens, not the summarization output
+                chunk, metadata = payload
+                if metadata.get("langgraph_node") == "conversation" and chunk.content:
+                    yield format_event({"type": "token", "content": chunk.content})
+            
+            yield format_event({"type": "done", **build_response(user_message, output, thread_id)})
+        
+        except Exception as e:
+            app.logger.error(f"Error streaming message: {str(e)}")
+            yield format_event({"type": "error", "error": f"Error processing your message: {str(e)}"})
     
-    app.run(host="0.0.0.0", port=port, debug=debug)
\ No newline at end of file
+    response = await make_response(events(), {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache"
+    })
+    # LLM answers can take longer than the default response timeout
+    response.timeout = None
+    return response
\ No newline at end of file
@@ -2,6 +2,6 @@
 Chatbot module for the LangGraph-based conversational agent.
 """
 
-from src.chatbot.agent import chat, graph, graph_with_memory
+from src.chatbot.agent import chat, graph, create_graph_with_memory
 
-__all__ = ["chat", "graph", "graph_with_memory"]
\ No newline at end of file
+__all__ = ["chat", "graph", "create_graph_with_memory"]
\ No newline at end of file
@@ -2,47 +2,76 @@
 Implementation of the LangGraph-based conversational agent.
 """
 import os
-import sys
-from pathlib import Path
-
-# Add the root directory to the Python PATH to allow relative imports when the script is executed directly
-current_dir = Path(os.path.dirname(os.path.realpath(__file__)))
-root_dir = current_dir.parent.parent
-if str(root_dir) not in sys.path:
-    sys.path.insert(0, str(root_dir))
+import asyncio
+import threading
+import time
+from collections import OrderedDict
 
 from langchain_core.messages import HumanMessage, SystemMessage, RemoveMessage
 from langgraph.graph import MessagesState
 from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
 from langgraph.prebuilt import tools_condition, ToolNode
 
-import sqlite3
-from langgraph.checkpoint.sqlite import SqliteSaver
+import httpx
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langchain_openai import ChatOpenAI
 
 from src.database import VectorStoreManager
-from src.config.settings import LLM_MODEL, DB_PATH, DEFAULT_SEARCH_RESULTS
+from src.config.settings import (
+    LLM_MODEL, DB_PATH, DEFAULT_SEARCH_RESULTS, DEBUG_PATHS, SUMMARY_MESSAGE_THRESHOLD
+)
 
 # Ensure the database directory exists
 db_dir = os.path.dirname(DB_PATH)
-print(f"DB_DIR: {db_dir}")
-print(f"DB_PATH: {DB_PATH}")
+if DEBUG_PATHS:
+    print(f"DB_DIR: {db_dir}")
+    print(f"DB_PATH: {DB_PATH}")
 #os.makedirs(db_dir, exist_ok=True)
 
-# Initialize the database connection
-conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+# Connection settings for the checkpoint database
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+)
+
+# Initialize the LLM with a pooled HTTP/2 client, so concurrent conversations
+# reuse open connections instead of paying a TCP/TLS handshake per request
+model = ChatOpenAI(
+    model=LLM_MODEL,
+    temperature=0,
+    http_async_client=httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+    )
+)
+
+# Open the vector store once and share it across tool calls; the Chroma client
+# and the embeddings HTTP client are both safe to use from multiple threads
+_VECTOR_DB = VectorStoreManager()
 
-# Initialize the memory checkpointer
-memory = SqliteSaver(conn)
+# Memoized search results, keyed by lowercased query: (time of the search, results)
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 300
+_search_cache = OrderedDict()
+_search_cache_lock = threading.Lock()
 
-# Initialize the LLM
-model = ChatOpenAI(model=LLM_MODEL, temperature=0)
+# System prompt used once the conversation has a summary
+_SYSTEM_PREFIX = (
+    "You are a helpful Intelligent Contract Template Selector assistant specializing in "
+    "Non-disclosure agreement (NDA). Use the search_documents tool to retrieve relevant "
+    "information about NDA contracts. Summary of conversation earlier: "
+)
 
 # State class to store messages and summary
 class State(MessagesState):
     summary: str
 
-def call_model(state: State):
+async def call_model(state: State):
     """
     Calls the LLM with the current state and returns the response.
     
@@ -57,16 +86,65 @@ def call_model(state: State):
 
     # If there is summary, then we add it to messages
     if summary:
-        # Add summary to system message
-        system_message = f"You are a helpful Intelligent Contract Template Selector assistant specializing in Non-disclosure agreement (NDA). Use the search_documents tool to retrieve relevant information about NDA contracts. Summary of conversation earlier: {summary}"
-        # Append summary to any newer messages
-        messages = [SystemMessage(content=system_message)] + state["messages"]
+        # Add summary to system message and prepend it to any newer messages
+        messages = [SystemMessage(content=_SYSTEM_PREFIX + summary), *state["messages"]]
     else:
         messages = state["messages"]
     
-    response = model.invoke(messages)
+    response = await _BOUND_MODEL.ainvoke(messages)
     return {"messages": response}
 
+def _cached_search(query: str) -> tuple:
+    """
+    Runs the vector search for a query, memoizing repeated questions.
+    
+    Queries differing only in case share a cache entry, but the search itself
+    uses the query as given. Entries expire after SEARCH_CACHE_TTL seconds, so
+    documents added by the ingestion pipeline show up in later results.
+    
+    Args:
+        query: Stripped query string
+        
+    Returns:
+        Tuple of (document, score) pairs
+    """
+    key = query.lower()
+    with _search_cache_lock:
+        entry = _search_cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < SEARCH_CACHE_TTL:
+            _search_cache.move_to_end(key)
+            return entry[1]
+    
+    results = tuple(_VECTOR_DB.search_with_score(query, k=DEFAULT_SEARCH_RESULTS))
+    with _search_cache_lock:
+        _search_cache[key] = (time.monotonic(), results)
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+    return results
+
+def warm_up_vector_store():
+    """
+    Runs a throwaway search in a background thread.
+    
+    The first search opens the HNSW index and the embeddings client; doing it
+    right after startup keeps that cost off the first user's request.
+    """
+    threading.Thread(
+        target=lambda: _VECTOR_DB.search_with_score("warmup", k=1),
+        daemon=True
+    ).start()
+
+def clear_search_cache():
+    """
+    Drops the memoized search results.
+    
+    Cached results expire on their own; call it to see documents added to the
+    vector store right away.
+    """
+    with _search_cache_lock:
+        _search_cache.clear()
+
 def retrieve_search_results(query: str) -> dict:
     """
     Search for examples of Non-disclosure agreement contracts.
@@ -80,27 +158,19 @@ def retrieve_search_results(query: str) -> dict:
         dict: A dictionary containing formatted search results with content, filename, 
               page information and similarity scores.
     """
-    vector_db = VectorStoreManager()
-    results = vector_db.search_with_score(query, k=DEFAULT_SEARCH_RESULTS)
-    
-    formatted_results = []
+    results = _cached_search(query.strip())
     
-    for doc, score in results:
-        result = {
+    formatted_results = [
+        {
             "content": doc.page_content,
             "filename": doc.metadata.get("filename", "Unknown"),
-            "score": score
+            "score": score,
+            # Add page label and page number if available
+            **({"page_label": doc.metadata["page_label"]} if "page_label" in doc.metadata else {}),
+            **({"page": doc.metadata["page"]} if "page" in doc.metadata else {})
         }
-        
-        # Add page label if available
-        if "page_label" in doc.metadata:
-            result["page_label"] = doc.metadata["page_label"]
-        
-        # Add page number if available
-        if "page" in doc.metadata:
-            result["page"] = doc.metadata["page"]
-            
-        formatted_results.append(result)
+        for doc, score in results
+    ]
     
     return {
         "search_results": formatted_results,
@@ -117,16 +187,14 @@ def should_continue(state: State):
     Returns:
         Next node to execute
     """
-    messages = state["messages"]
-    
-    # If there are more than twelve messages, then we summarize the conversation
-    if len(messages) > 12:
+    # If the history grew past the threshold, then we summarize the conversation
+    if len(state["messages"]) > SUMMARY_MESSAGE_THRESHOLD:
         return "summarize_conversation"
     
     # Otherwise we can just end
     return END
 
-def summarize_conversation(state: State):
+async def summarize_conversation(state: State):
     """
     Summarizes the conversation to reduce token usage.
     
@@ -151,16 +219,19 @@ def summarize_conversation(state: State):
         summary_message = "Create a summary of the conversation above:"
 
     # Add prompt to our history
-    messages = state["messages"] + [HumanMessage(content=summary_message)]
-    response = model.invoke(messages)
+    history = state["messages"]
+    response = await model.ainvoke([*history, HumanMessage(content=summary_message)])
     
-    # Delete all but the 2 most recent messages and add our summary to the state 
-    delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][:-2]]
-    return {"summary": response.content, "messages": delete_messages}
+    # Replace the history with its 2 most recent messages and add our summary
+    # to the state; a single REMOVE_ALL_MESSAGES marker clears the list without
+    # building one RemoveMessage per deleted message
+    remaining_messages = [RemoveMessage(id=REMOVE_ALL_MESSAGES), *history[-2:]]
+    return {"summary": response.content, "messages": remaining_messages}
 
-# Define the tools
+# Define the tools and bind them to the model once; the summarization step
+# keeps using the plain model, since it never calls tools
 tools = [retrieve_search_results]
-model = model.bind_tools(tools)
+_BOUND_MODEL = model.bind_tools(tools)
 
 # Define the graph
 workflow = StateGraph(State)
@@ -177,27 +248,57 @@ workflow.add_edge("summarize_conversation", END)
 
 # Compile the graph
 graph = workflow.compile()
-graph_with_memory = workflow.compile(checkpointer=memory)
 
-def chat():
+async def create_graph_with_memory():
+    """
+    Compiles the graph with a persistent SQLite checkpointer.
+    
+    The async checkpointer is bound to the running event loop, so this must be
+    awaited from the loop that will serve the conversations.
+    
+    Returns:
+        Compiled graph that stores the conversation state in DB_PATH
+    """
+    conn = await aiosqlite.connect(DB_PATH)
+    
+    # Every graph step writes a checkpoint, so use WAL to append instead of
+    # fsyncing the whole journal on each commit and to let readers run alongside
+    for pragma in SQLITE_PRAGMAS:
+        await conn.execute(pragma)
+    
+    memory = AsyncSqliteSaver(conn)
+    return workflow.compile(checkpointer=memory)
+
+async def achat():
     """
     Interactive chat loop for the conversational agent.
     """
+    warm_up_vector_store()
+    graph_with_memory = await create_graph_with_memory()
     config = {"configurable": {"thread_id": "2"}}  # Use a thread ID for persistent memory
     print("Chatbot is ready! Type 'exit' to end the conversation.")
     
-    while True:
-        user_input = input("You: ")
-        if user_input.lower() == 'exit':
-            break
-        
-        # Create a HumanMessage and invoke the graph
-        messages = [HumanMessage(content=user_input)]
-        output = graph_with_memory.invoke({"messages": messages}, config)
-        
-        # Print the chatbot's response
-        for m in output['messages']:
-            m.pretty_print()
+    try:
+        while True:
+            user_input = input("You: ")
+            if user_input.lower() == 'exit':
+                break
+            
+            # Create a HumanMessage and invoke the graph
+            messages = [HumanMessage(content=user_input)]
+            output = await graph_with_memory.ainvoke({"messages": messages}, config)
+            
+            # Print the chatbot's response
+            for m in output['messages']:
+                m.pretty_print()
+    finally:
+        await graph_with_memory.checkpointer.conn.close()
+
+def chat():
+    """
+    Runs the interactive chat loop on a new event loop.
+    """
+    asyncio.run(achat())
 
 # Allow the script to be executed directly
 if __name__ == "__main__":
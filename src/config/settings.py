@@ -2,18 +2,14 @@
 Configuration settings for the chatbot application.
 """
 import os
-import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
 # Determine if we are in a Docker environment or local development
 IN_DOCKER = os.environ.get('IN_DOCKER', '0') == '1'
 
-# Add the root directory to Python PATH to allow relative imports
-current_dir = Path(os.path.dirname(os.path.realpath(__file__)))
-root_dir = current_dir.parent.parent
-if str(root_dir) not in sys.path:
-    sys.path.insert(0, str(root_dir))
+# Project root, used to resolve the default local data paths
+root_dir = Path(__file__).resolve().parent.parent.parent
 
 # Load environment variables
 load_dotenv()
@@ -26,12 +22,19 @@ else:
     DEFAULT_VECTOR_STORE_DIR = os.path.join(str(root_dir), "chroma_db")
     DEFAULT_DB_PATH = os.path.join(str(root_dir), "data", "chat.db")
 
-print('DEFAULT_DB_PATH', DEFAULT_DB_PATH)
-print('DEFAULT_VECTOR_STORE_DIR', DEFAULT_VECTOR_STORE_DIR)
+# Print the resolved paths only when diagnosing path issues
+DEBUG_PATHS = bool(os.environ.get("DEBUG_PATHS"))
+if DEBUG_PATHS:
+    print('DEFAULT_DB_PATH', DEFAULT_DB_PATH)
+    print('DEFAULT_VECTOR_STORE_DIR', DEFAULT_VECTOR_STORE_DIR)
 
 VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", DEFAULT_VECTOR_STORE_DIR)
 #VECTOR_STORE_DIR = DEFAULT_VECTOR_STORE_DIR
 
+# Storage engine of the vector database: "chroma", "faiss", or "sqlite-vec"
+# (the latter keeps the vectors in the chat memory database, DB_PATH)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+
 # LLM settings
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
@@ -41,4 +44,12 @@ EMBEDDING_DIMENSIONS = 1536  # Default dimension for text-embedding-3-small
 DB_PATH = os.getenv("DB_PATH", DEFAULT_DB_PATH)
 
 # Search settings
-DEFAULT_SEARCH_RESULTS = int(os.getenv("DEFAULT_SEARCH_RESULTS", "8"))
\ No newline at end of file
+DEFAULT_SEARCH_RESULTS = int(os.getenv("DEFAULT_SEARCH_RESULTS", "8"))
+# Return no results, without embedding the query, when almost none of its
+# character trigrams occur in the ingested texts (off by default: it also drops
+# valid semantic matches such as paraphrases or other languages)
+SEARCH_NGRAM_FILTER = os.getenv("SEARCH_NGRAM_FILTER", "0") == "1"
+
+# Conversation settings
+# Number of messages after which the conversation is summarized
+SUMMARY_MESSAGE_THRESHOLD = int(os.getenv("SUMMARY_MESSAGE_THRESHOLD", "12"))
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+Numba-compiled cosine similarity and top-k selection for the JSON-file query path.
+"""
+import numpy as np
+from numba import njit, prange
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _cosine_similarities(mat: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Computes the cosine similarity of each row of mat with q, rows in parallel."""
+    n, d = mat.shape
+    norm_q = np.sqrt(np.dot(q, q))
+    sims = np.empty(n, dtype=np.float32)
+    for i in prange(n):
+        dot = 0.0
+        norm = 0.0
+        for j in range(d):
+            v = mat[i, j]
+            dot += v * q[j]
+            norm += v * v
+        sims[i] = dot / (np.sqrt(norm) * norm_q + 1e-12)
+    return sims
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _cosine_similarities_with_norms(mat: np.ndarray, q: np.ndarray, norms: np.ndarray) -> np.ndarray:
+    """Computes the cosine similarity of each row of mat with q, using precomputed row norms."""
+    n, d = mat.shape
+    norm_q = np.sqrt(np.dot(q, q))
+    sims = np.empty(n, dtype=np.float32)
+    for i in prange(n):
+        dot = 0.0
+        for j in range(d):
+            dot += mat[i, j] * q[j]
+        sims[i] = dot / (norms[i] * norm_q + 1e-12)
+    return sims
+
+@njit(cache=True)
+def _select_top_k(sims: np.ndarray, k: int) -> tuple:
+    """Selects the k highest similarities with an insertion sort into fixed-size arrays."""
+    k = min(k, len(sims))
+    best_idx = np.full(k, -1, dtype=np.int64)
+    best_sim = np.full(k, -np.inf, dtype=np.float32)
+    if k == 0:
+        return best_idx, best_sim
+    
+    for i in range(len(sims)):
+        s = sims[i]
+        if s > best_sim[k - 1]:
+            j = k - 1
+            while j > 0 and best_sim[j - 1] < s:
+                best_sim[j] = best_sim[j - 1]
+                best_idx[j] = best_idx[j - 1]
+                j -= 1
+            best_sim[j] = s
+            best_idx[j] = i
+    return best_idx, best_sim
+
+@njit(cache=True)
+def cosine_topk(mat: np.ndarray, q: np.ndarray, k: int) -> tuple:
+    """
+    Finds the k rows of mat most similar to q.
+    
+    Args:
+        mat: (N, D) float32 matrix of embeddings
+        q: (D,) float32 query embedding
+        k: Number of rows to return
+    
+    Returns:
+        Tuple (indices, similarities) of the top min(k, N) rows, highest first
+    """
+    return _select_top_k(_cosine_similarities(mat, q), k)
+
+@njit(cache=True)
+def cosine_topk_with_norms(mat: np.ndarray, q: np.ndarray, norms: np.ndarray, k: int) -> tuple:
+    """
+    Finds the k rows of mat most similar to q, given the L2 norm of each row.
+    
+    Args:
+        mat: (N, D) float32 matrix of embeddings
+        q: (D,) float32 query embedding
+        norms: (N,) float32 norms of the rows of mat
+        k: Number of rows to return
+    
+    Returns:
+        Tuple (indices, similarities) of the top min(k, N) rows, highest first
+    """
+    return _select_top_k(_cosine_similarities_with_norms(mat, q, norms), k)
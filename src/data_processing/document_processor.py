@@ -1,88 +1,124 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterable, Iterator
 import os
-from langchain_community.document_loaders import PyPDFLoader, TextLoader, BSHTMLLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from bs4 import BeautifulSoup
+import sys
+from langchain_community.document_loaders import TextLoader
+from langchain.docstore.document import Document
+from selectolax.lexbor import LexborHTMLParser
+from semantic_text_splitter import TextSplitter
+import fitz
+
+PDF_TEXT_FLAGS = fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_DEHYPHENATE
 
 class DocumentProcessor:
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            separators=["\n\n", "\n", " ", ""]
+        # Rust splitter: chunks of up to 1000 characters with 200 characters of overlap
+        self.text_splitter = TextSplitter(capacity=1000, overlap=200)
+        
+        # Chunk generator for each supported extension
+        self._handlers = {
+            'txt': self._iter_txt,
+            'htm': self._iter_htm,
+            'html': self._iter_htm,
+            'pdf': self._iter_pdf
+        }
+    
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """Splits documents into chunks, copying each document's metadata to its chunks."""
+        return list(self.iter_split_documents(documents))
+    
+    def iter_split_documents(self, documents: Iterable[Document], metadata: tuple = ()) -> Iterator[Document]:
+        """
+        Splits documents into chunks lazily, one source document at a time.
+        
+        Each chunk gets a copy of its source document's metadata, updated with
+        the items in metadata.
+        """
+        for doc in documents:
+            for chunk in self.text_splitter.chunks(doc.page_content):
+                chunk_metadata = dict(doc.metadata)
+                chunk_metadata.update(metadata)
+                yield Document(page_content=chunk, metadata=chunk_metadata)
+    
+    def _file_metadata(self, file_path: str, extension: str, stat: os.stat_result = None,
+                       **extra: Any) -> tuple:
+        """
+        Builds the metadata shared by every chunk of a file.
+        
+        A single os.stat result provides the size and timestamps (it is taken
+        here when the caller does not pass one), and the result is returned as
+        a tuple of items that dict.update consumes directly.
+        The path, filename and extension repeat on every chunk, so they are
+        interned to share one string object.
+        """
+        if stat is None:
+            stat = os.stat(file_path)
+        return (
+            ('source', sys.intern(file_path)),
+            ('filename', sys.intern(os.path.basename(file_path))),
+            ('extension', sys.intern(extension)),
+            ('file_size', stat.st_size),
+            ('creation_time', stat.st_ctime),
+            ('modification_time', stat.st_mtime),
+            *extra.items()
         )
     
-    def process_txt(self, file_path: str) -> List[Dict[str, Any]]:
+    def process_txt(self, file_path: str, stat: os.stat_result = None) -> List[Dict[str, Any]]:
         """Processes TXT files."""
+        return list(self._iter_txt(file_path, stat))
+    
+    def _iter_txt(self, file_path: str, stat: os.stat_result = None) -> Iterator[Document]:
+        """Yields the chunks of a TXT file."""
         loader = TextLoader(file_path)
         documents = loader.load()
         
         # Extract metadata
-        metadata = {
-            'source': file_path,
-            'filename': os.path.basename(file_path),
-            'extension': 'txt',
-            'file_size': os.path.getsize(file_path),
-            'creation_time': os.path.getctime(file_path),
-            'modification_time': os.path.getmtime(file_path)
-        }
+        metadata = self._file_metadata(file_path, 'txt', stat)
         
-        # Split text into chunks
-        chunks = self.text_splitter.split_documents(documents)
-        
-        # Update metadata for each chunk
-        for chunk in chunks:
-            chunk.metadata.update(metadata)
-            
-        return chunks
+        # Split text into chunks, one source document at a time
+        yield from self.iter_split_documents(documents, metadata)
     
-    def process_htm(self, file_path: str) -> List[Dict[str, Any]]:
+    def process_htm(self, file_path: str, stat: os.stat_result = None) -> List[Dict[str, Any]]:
         """Processes HTM files."""
-        loader = BSHTMLLoader(file_path)
-        documents = loader.load()
-
-        # Clean HTML content
-        cleaned_documents = []
-        for doc in documents:
-            soup = BeautifulSoup(doc.page_content, 'html.parser')
-            cleaned_text = soup.get_text(separator=" ").strip()  # Extract clean text
-            doc.page_content = cleaned_text  # Update document content
-            cleaned_documents.append(doc)
+        return list(self._iter_htm(file_path, stat))
+    
+    def _iter_htm(self, file_path: str, stat: os.stat_result = None) -> Iterator[Document]:
+        """Yields the chunks of a HTM file."""
+        # Parse the raw bytes once with the Lexbor C parser
+        with open(file_path, 'rb') as f:
+            tree = LexborHTMLParser(f.read())
+        
+        # Extract clean text; there is a single document per file
+        root = tree.body if tree.body is not None else tree.root
+        cleaned_documents = [Document(
+            page_content=root.text(separator=" ", strip=True),
+            metadata={'source': file_path}
+        )]
 
         # Extract metadata
-        metadata = {
-            'source': file_path,
-            'filename': os.path.basename(file_path),
-            'extension': 'htm',
-            'file_size': os.path.getsize(file_path),
-            'creation_time': os.path.getctime(file_path),
-            'modification_time': os.path.getmtime(file_path)
-        }
+        metadata = self._file_metadata(file_path, 'htm', stat)
 
-        # Split text into chunks
-        chunks = self.text_splitter.split_documents(cleaned_documents)
-
-        # Update metadata for each chunk
-        for chunk in chunks:
-            chunk.metadata.update(metadata)
-
-        return chunks
+        # Split text into chunks, one source document at a time
+        yield from self.iter_split_documents(cleaned_documents, metadata)
     
-    def process_pdf(self, file_path: str) -> List[Dict[str, Any]]:
+    def process_pdf(self, file_path: str, stat: os.stat_result = None) -> List[Dict[str, Any]]:
         """Processes PDF files without using OCR."""
-        loader = PyPDFLoader(file_path)
-        documents = loader.load()
+        return list(self._iter_pdf(file_path, stat))
+    
+    def _iter_pdf(self, file_path: str, stat: os.stat_result = None) -> Iterator[Document]:
+        """Yields the chunks of a PDF file."""
+        # Extract the text of each page with MuPDF, serially on one handle:
+        # MuPDF does not support multithreading, and files are already parsed
+        # in parallel across worker processes
+        with fitz.open(file_path) as pdf:
+            texts = [page.get_text('text', flags=PDF_TEXT_FLAGS) for page in pdf]
+        
+        documents = [
+            Document(page_content=text, metadata={'source': file_path, 'page': i})
+            for i, text in enumerate(texts)
+        ]
         
         # Extract metadata
-        metadata = {
-            'source': file_path,
-            'filename': os.path.basename(file_path),
-            'extension': 'pdf',
-            'file_size': os.path.getsize(file_path),
-            'creation_time': os.path.getctime(file_path),
-            'modification_time': os.path.getmtime(file_path),
-            'page_count': len(documents)
-        }
+        metadata = self._file_metadata(file_path, 'pdf', stat, page_count=len(documents))
         
         # Add page-specific metadata
         for doc in documents:
@@ -91,27 +127,26 @@ class DocumentProcessor:
                 'total_pages': len(documents)
             })
         
-        # Split text into chunks
-        chunks = self.text_splitter.split_documents(documents)
-        
-        # Update metadata for each chunk
-        for chunk in chunks:
-            chunk.metadata.update(metadata)
-            
-        return chunks
+        # Split text into chunks, one source document at a time
+        yield from self.iter_split_documents(documents, metadata)
     
     def process_file(self, file_path: str) -> List[Dict[str, Any]]:
         """Processes a file based on its extension."""
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found: {file_path}")
+        return list(self.iter_process_file(file_path))
+    
+    def iter_process_file(self, file_path: str) -> Iterator[Document]:
+        """
+        Processes a file based on its extension, yielding its chunks as they are split.
+        
+        The stat call and the extension check run when the generator is created,
+        so a missing or unsupported file fails immediately.
+        """
+        # A single stat call, reused for the metadata; raises FileNotFoundError if missing
+        stat = os.stat(file_path)
         
-        extension = file_path.split('.')[-1].lower()
+        extension = os.path.splitext(file_path)[1][1:].lower()
         
-        if extension == 'txt':
-            return self.process_txt(file_path)
-        elif extension == 'htm':
-            return self.process_htm(file_path)
-        elif extension == 'pdf':
-            return self.process_pdf(file_path)
-        else:
-            raise ValueError(f"Unsupported format: {extension}")
\ No newline at end of file
+        handler = self._handlers.get(extension)
+        if handler is None:
+            raise ValueError(f"Unsupported format: {extension}")
+        return handler(file_path, stat)
\ No newline at end of file
@@ -1,24 +1,74 @@
 import os
-import json
-from typing import List, Dict, Any
+import sys
+from contextlib import contextmanager
+import orjson
+from typing import TYPE_CHECKING, List, Dict, Any, Iterable, Iterator, Optional
 from datetime import datetime
 from langchain.docstore.document import Document
 import hashlib
 import numpy as np
 
+# pyarrow and faiss are imported where the consolidated index is built or
+# loaded, so the ingestion workers that import this module do not load them
+if TYPE_CHECKING:
+    import faiss
+
+# Number of characters encoded at a time when hashing text content
+HASH_SLICE_SIZE = 65536
+
+# Storage types supported for the embedding matrices
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+# Metadata values repeated on every chunk of a file
+INTERNED_METADATA_KEYS = ('source', 'filename', 'extension')
+
+class ChunksWriter:
+    """Writes the chunks of a document to its JSON Lines file one at a time."""
+    
+    def __init__(self, file, serialize):
+        """
+        Initializes the writer.
+        
+        Args:
+            file: Binary file opened for writing, positioned after the header
+            serialize: Function converting a Document to a JSON-serializable dictionary
+        """
+        self._file = file
+        self._serialize = serialize
+        self.count = 0
+    
+    def write(self, doc: Document):
+        """Appends one chunk to the file."""
+        self._file.write(orjson.dumps(self._serialize(doc), option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
+        self.count += 1
+
 class JsonSerializer:
-    """Class to serialize and store chunks and embeddings in JSON files."""
+    """Class to serialize and store chunks in JSON files and embeddings in NumPy files."""
+    
+    MANIFEST_FILE = "_manifest.json"
+    CORPUS_MATRIX_FILE = "_corpus.f16.npy"
+    CORPUS_OFFSETS_FILE = "_corpus_offsets.parquet"
+    CORPUS_NORMS_FILE = "_corpus_norms.npy"
+    FAISS_INDEX_FILE = "_corpus.faiss"
+    FAISS_INDEX_TYPES = ("faiss-flat", "faiss-hnsw")
+    FILES_PROCESSED_KEY = b"files_processed"
     
-    def __init__(self, chunks_dir="chunks", embeddings_dir="embeddings"):
+    def __init__(self, chunks_dir="chunks", embeddings_dir="embeddings", embedding_dtype="float16"):
         """
         Initializes the JSON serializer.
         
         Args:
             chunks_dir: Directory where chunks will be stored
             embeddings_dir: Directory where embeddings will be stored
+            embedding_dtype: Storage type of saved embeddings: float32, float16, or
+                int8 (quantized with one float16 scale per vector)
         """
+        if embedding_dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype: {embedding_dtype}")
+        
         self.chunks_dir = chunks_dir
         self.embeddings_dir = embeddings_dir
+        self.embedding_dtype = embedding_dtype
         
         # Create directories if they do not exist
         os.makedirs(chunks_dir, exist_ok=True)
@@ -48,8 +98,25 @@ class JsonSerializer:
         return document_id
     
     def _calculate_content_hash(self, content: str) -> str:
-        """Calculates the SHA-256 hash of the content."""
-        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+        """Calculates the SHA-256 hash of the content, encoding it in fixed-size slices."""
+        digest = hashlib.sha256()
+        for start in range(0, len(content), HASH_SLICE_SIZE):
+            digest.update(content[start:start + HASH_SLICE_SIZE].encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _calculate_texts_hash(self, texts: Iterable[str]) -> str:
+        """Calculates the SHA-256 hash of a sequence of texts, each prefixed with its length."""
+        digest = hashlib.sha256()
+        for text in texts:
+            digest.update(f"{len(text)}:".encode('utf-8'))
+            for start in range(0, len(text), HASH_SLICE_SIZE):
+                digest.update(text[start:start + HASH_SLICE_SIZE].encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _calculate_file_hash(self, file_path: str) -> str:
+        """Calculates the SHA-256 hash of a file's raw bytes."""
+        with open(file_path, 'rb') as f:
+            return hashlib.file_digest(f, 'sha256').hexdigest()
     
     def _document_to_dict(self, doc: Document) -> Dict[str, Any]:
         """Converts a Document object to a dictionary."""
@@ -60,74 +127,147 @@ class JsonSerializer:
     
     def _dict_to_document(self, doc_dict: Dict[str, Any]) -> Document:
         """Converts a dictionary to a Document object."""
+        metadata = doc_dict["metadata"]
+        
+        # Decoding creates a new string per chunk; intern them so chunks share one copy
+        for key in INTERNED_METADATA_KEYS:
+            value = metadata.get(key)
+            if isinstance(value, str):
+                metadata[key] = sys.intern(value)
+        
         return Document(
             page_content=doc_dict["page_content"],
-            metadata=doc_dict["metadata"]
+            metadata=metadata
         )
     
-    def save_chunks(self, documents: List[Document], file_path: str) -> str:
+    def get_document_id(self, documents: List[Document], file_path: str) -> str:
         """
-        Saves the chunks of a document to a JSON file.
+        Generates the ID of a document from the original file's bytes, falling
+        back to the content of the first chunk if the file is gone.
         
         Args:
-            documents: List of documents (chunks) to be saved
+            documents: List of documents (chunks) of the file
             file_path: Path of the original file
             
         Returns:
-            Document ID used to save the chunks
+            Document ID
         """
-        if not documents:
-            return None
-            
-        # Generate a unique ID for the document based on the content of the first chunk
-        content_hash = self._calculate_content_hash(documents[0].page_content)
-        document_id = self._generate_document_id(file_path, content_hash)
-        
-        # Path of the output JSON file
-        json_file_path = os.path.join(self.chunks_dir, f"{document_id}.json")
+        if os.path.exists(file_path):
+            content_hash = self._calculate_file_hash(file_path)
+        else:
+            content_hash = self._calculate_content_hash(documents[0].page_content)
+        return self._generate_document_id(file_path, content_hash)
+    
+    @contextmanager
+    def open_chunks_writer(self, file_path: str, document_id: str) -> Iterator[ChunksWriter]:
+        """
+        Opens the JSON Lines chunks file of a document for incremental writing.
         
-        # Convert documents to dictionaries
-        doc_dicts = [self._document_to_dict(doc) for doc in documents]
+        The first line is a header with the processing metadata; each chunk
+        passed to the writer is then serialized and appended on its own line,
+        so the chunks never need to be held in memory together.
         
-        # Add processing metadata
-        output_data = {
+        Args:
+            file_path: Path of the original file
+            document_id: Document ID
+            
+        Yields:
+            ChunksWriter appending chunks to the file
+        """
+        # Processing metadata
+        header = {
             "document_id": document_id,
             "original_file": file_path,
-            "chunk_count": len(documents),
-            "processed_at": datetime.now().isoformat(),
-            "chunks": doc_dicts
+            "processed_at": datetime.now().isoformat()
         }
         
-        # Save to JSON
-        with open(json_file_path, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=2)
+        with open(self._chunks_path(document_id), 'wb') as f:
+            f.write(orjson.dumps(header) + b"\n")
+            yield ChunksWriter(f, self._document_to_dict)
+    
+    def save_chunks(self, documents: Iterable[Document], file_path: str, document_id: str = None) -> str:
+        """
+        Saves the chunks of a document to a JSON Lines file.
+        
+        documents may be any iterable, such as the generator returned by
+        DocumentProcessor.iter_process_file; chunks are written as they are
+        produced.
+        
+        Args:
+            documents: Documents (chunks) to be saved
+            file_path: Path of the original file
+            document_id: Document ID, generated with get_document_id if not provided
+            
+        Returns:
+            Document ID used to save the chunks, or None if there were no chunks
+        """
+        documents = iter(documents)
+        first = next(documents, None)
+        if first is None:
+            return None
+        
+        if document_id is None:
+            document_id = self.get_document_id([first], file_path)
+        
+        # Save the header followed by one chunk per line
+        with self.open_chunks_writer(file_path, document_id) as writer:
+            writer.write(first)
+            for doc in documents:
+                writer.write(doc)
             
         return document_id
     
-    def load_chunks(self, document_id: str) -> List[Document]:
+    def _chunks_path(self, document_id: str) -> str:
+        """Returns the path of the chunks file of a document."""
+        return os.path.join(self.chunks_dir, f"{document_id}.jsonl")
+    
+    def load_chunks(self, document_id: str) -> Iterator[Document]:
         """
-        Loads chunks from a JSON file.
+        Loads chunks from a JSON Lines file, one at a time.
         
         Args:
             document_id: Document ID
             
-        Returns:
-            List of Document objects
+        Yields:
+            Document objects, in the order they were saved
         """
-        json_file_path = os.path.join(self.chunks_dir, f"{document_id}.json")
+        chunks_file_path = self._chunks_path(document_id)
         
-        if not os.path.exists(json_file_path):
-            raise FileNotFoundError(f"Chunks file not found: {json_file_path}")
+        if not os.path.exists(chunks_file_path):
+            raise FileNotFoundError(f"Chunks file not found: {chunks_file_path}")
         
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-        return [self._dict_to_document(chunk) for chunk in data["chunks"]]
+        with open(chunks_file_path, 'rb') as f:
+            next(f)  # Skip the header
+            for line in f:
+                yield self._dict_to_document(orjson.loads(line))
+    
+    def _embeddings_paths(self, document_id: str) -> tuple:
+        """Returns the paths of the embedding matrix and of its metadata sidecar."""
+        return (
+            os.path.join(self.embeddings_dir, f"{document_id}_embeddings.npy"),
+            os.path.join(self.embeddings_dir, f"{document_id}_meta.jsonl")
+        )
+    
+    def _scales_path(self, document_id: str) -> str:
+        """Returns the path of the per-vector scales of an int8 embedding matrix."""
+        return os.path.join(self.embeddings_dir, f"{document_id}_scales.npy")
+    
+    def _norms_path(self, document_id: str) -> str:
+        """Returns the path of the L2 norms of an embedding matrix's rows."""
+        return os.path.join(self.embeddings_dir, f"{document_id}_norms.npy")
     
     def save_embeddings(self, document_id: str, embeddings: List[List[float]], texts: List[str], 
                        metadatas: List[Dict[str, Any]]) -> str:
         """
-        Saves embeddings to a JSON file.
+        Saves embeddings as a NumPy matrix with a JSON Lines sidecar.
+        
+        The vectors go to <document_id>_embeddings.npy with shape (N, D), stored
+        as the serializer's embedding_dtype, and the texts and metadata to
+        <document_id>_meta.jsonl, with a header line followed by one line per
+        embedding. The header records a hash of the full texts, since the
+        lines only keep their beginning. int8 matrices keep their scales in <document_id>_scales.npy.
+        The L2 norm of each stored vector goes to <document_id>_norms.npy, so
+        queries do not recompute it.
         
         Args:
             document_id: Document ID
@@ -136,59 +276,155 @@ class JsonSerializer:
             metadatas: List of corresponding metadata
             
         Returns:
-            Path of the embeddings JSON file
+            Path of the embeddings .npy file
         """
-        # Path of the output JSON file
-        json_file_path = os.path.join(self.embeddings_dir, f"{document_id}_embeddings.json")
+        npy_file_path, meta_file_path = self._embeddings_paths(document_id)
+        
+        # Store the vectors in binary form
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if self.embedding_dtype == "int8":
+            scales = np.abs(matrix).max(axis=1, keepdims=True) / 127
+            scales[scales == 0] = 1
+            quantized = np.round(matrix / scales).astype(np.int8)
+            scales = scales.astype(np.float16)
+            np.save(npy_file_path, quantized)
+            np.save(self._scales_path(document_id), scales)
+            stored = quantized.astype(np.float32) * scales.astype(np.float32)
+        else:
+            stored = matrix.astype(self.embedding_dtype)
+            np.save(npy_file_path, stored)
         
-        # Prepare data for saving
-        output_data = {
+        # Norms of the vectors as stored, i.e. as load_embeddings will return them
+        np.save(self._norms_path(document_id), np.linalg.norm(np.asarray(stored, dtype=np.float32), axis=1))
+        
+        # Prepare the metadata for saving
+        header = {
             "document_id": document_id,
-            "embedding_count": len(embeddings),
+            "embedding_count": len(matrix),
             "embedding_model": "text-embedding-3-small",
-            "embedding_dimensions": len(embeddings[0]) if embeddings else 0,
-            "created_at": datetime.now().isoformat(),
-            "items": [
-                {
-                    "text": text[:200] + ("..." if len(text) > 200 else ""),  # Truncated text to save space
-                    "metadata": metadata,
-                    "embedding": embedding  # Embedding vector
-                }
-                for text, metadata, embedding in zip(texts, metadatas, embeddings)
-            ]
+            "embedding_dimensions": matrix.shape[1] if matrix.ndim == 2 else 0,
+            "embedding_dtype": self.embedding_dtype,
+            "texts_hash": self._calculate_texts_hash(texts),
+            "created_at": datetime.now().isoformat()
         }
         
-        # Save to JSON
-        with open(json_file_path, 'w', encoding='utf-8') as f:
-            # Use default=float to convert numpy arrays to lists
-            json.dump(output_data, f, ensure_ascii=False, indent=2, default=float)
+        # Save the header followed by one item per line
+        with open(meta_file_path, 'wb') as f:
+            f.write(orjson.dumps(header) + b"\n")
+            for text, metadata in zip(texts, metadatas):
+                item = {
+                    "text": text[:200] + ("..." if len(text) > 200 else ""),  # Truncated text to save space
+                    "metadata": metadata
+                }
+                f.write(orjson.dumps(item, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
             
-        return json_file_path
+        return npy_file_path
     
     def load_embeddings(self, document_id: str) -> Dict[str, Any]:
         """
-        Loads embeddings from a JSON file.
+        Loads embeddings saved by save_embeddings.
+        
+        float32 matrices are memory-mapped, so rows are only read from disk when
+        used; float16 and int8 matrices are converted back to float32 on load.
         
         Args:
             document_id: Document ID
             
         Returns:
-            Dictionary with embeddings, texts, and metadata
+            Dictionary with embeddings (an (N, D) float32 array), their norms
+            (an (N,) float32 array, or None for files saved without norms),
+            texts, and metadata
         """
-        json_file_path = os.path.join(self.embeddings_dir, f"{document_id}_embeddings.json")
+        npy_file_path, meta_file_path = self._embeddings_paths(document_id)
+        
+        if not os.path.exists(npy_file_path):
+            raise FileNotFoundError(f"Embeddings file not found: {npy_file_path}")
+        
+        texts = []
+        metadatas = []
+        with open(meta_file_path, 'rb') as f:
+            header = orjson.loads(next(f))
+            for line in f:
+                item = orjson.loads(line)
+                texts.append(item["text"])
+                metadatas.append(item["metadata"])
         
-        if not os.path.exists(json_file_path):
-            raise FileNotFoundError(f"Embeddings file not found: {json_file_path}")
+        embeddings = np.load(npy_file_path, mmap_mode='r')
+        dtype = header.get("embedding_dtype", "float32")
+        if dtype == "int8":
+            embeddings = embeddings.astype(np.float32) * np.load(self._scales_path(document_id)).astype(np.float32)
+        elif dtype != "float32":
+            embeddings = embeddings.astype(np.float32)
         
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        norms_path = self._norms_path(document_id)
+        norms = np.load(norms_path) if os.path.exists(norms_path) else None
             
         return {
-            "embeddings": [item["embedding"] for item in data["items"]],
-            "texts": [item["text"] for item in data["items"]],
-            "metadatas": [item["metadata"] for item in data["items"]]
+            "embeddings": embeddings,
+            "norms": norms,
+            "texts": texts,
+            "metadatas": metadatas
         }
     
+    def has_chunks(self, document_id: str) -> bool:
+        """Checks whether the chunks of a document were saved."""
+        return os.path.exists(self._chunks_path(document_id))
+    
+    def has_embeddings(self, document_id: str) -> bool:
+        """Checks whether the embeddings of a document were saved."""
+        npy_file_path, meta_file_path = self._embeddings_paths(document_id)
+        return os.path.exists(npy_file_path) and os.path.exists(meta_file_path)
+    
+    def has_embeddings_for(self, document_id: str, texts: List[str]) -> bool:
+        """
+        Checks whether the embeddings of a document were saved for exactly these texts.
+        
+        Only the header of the metadata sidecar is read; files saved without a
+        texts hash never match.
+        
+        Args:
+            document_id: Document ID
+            texts: Texts of the document's chunks, in order
+            
+        Returns:
+            True if the saved embeddings can be reused for the texts
+        """
+        if not self.has_embeddings(document_id):
+            return False
+        
+        _, meta_file_path = self._embeddings_paths(document_id)
+        with open(meta_file_path, 'rb') as f:
+            header = orjson.loads(next(f))
+        return (header.get("embedding_count") == len(texts)
+                and header.get("texts_hash") == self._calculate_texts_hash(texts))
+    
+    def load_manifest(self) -> Dict[str, List]:
+        """
+        Loads the manifest of processed source files.
+        
+        Returns:
+            Dictionary mapping each source path to [size, mtime, document_id]
+        """
+        manifest_path = os.path.join(self.chunks_dir, self.MANIFEST_FILE)
+        
+        if not os.path.exists(manifest_path):
+            return {}
+        
+        with open(manifest_path, 'rb') as f:
+            return orjson.loads(f.read())
+    
+    def save_manifest(self, manifest: Dict[str, List]):
+        """
+        Saves the manifest of processed source files.
+        
+        Args:
+            manifest: Dictionary mapping each source path to [size, mtime, document_id]
+        """
+        manifest_path = os.path.join(self.chunks_dir, self.MANIFEST_FILE)
+        
+        with open(manifest_path, 'wb') as f:
+            f.write(orjson.dumps(manifest))
+    
     def list_processed_documents(self) -> List[str]:
         """
         Lists all IDs of documents that have been processed (have chunks).
@@ -198,12 +434,14 @@ class JsonSerializer:
         """
         if not os.path.exists(self.chunks_dir):
             return []
-            
-        return [
-            os.path.splitext(file)[0]
-            for file in os.listdir(self.chunks_dir)
-            if file.endswith(".json")
-        ]
+        
+        suffix = ".jsonl"
+        with os.scandir(self.chunks_dir) as entries:
+            return [
+                entry.name[:-len(suffix)]
+                for entry in entries
+                if entry.name.endswith(suffix) and entry.is_file()
+            ]
     
     def list_embedded_documents(self) -> List[str]:
         """
@@ -214,9 +452,179 @@ class JsonSerializer:
         """
         if not os.path.exists(self.embeddings_dir):
             return []
+        
+        suffix = "_embeddings.npy"
+        with os.scandir(self.embeddings_dir) as entries:
+            return [
+                entry.name[:-len(suffix)]
+                for entry in entries
+                if entry.name.endswith(suffix) and entry.is_file()
+            ]
+    
+    def _corpus_paths(self) -> tuple:
+        """Returns the paths of the consolidated embedding matrix, its offsets table, and its row norms."""
+        return (
+            os.path.join(self.embeddings_dir, self.CORPUS_MATRIX_FILE),
+            os.path.join(self.embeddings_dir, self.CORPUS_OFFSETS_FILE),
+            os.path.join(self.embeddings_dir, self.CORPUS_NORMS_FILE)
+        )
+    
+    def build_corpus_index(self) -> int:
+        """
+        Consolidates the embeddings of every document into a single matrix.
+        
+        The rows of all <document_id>_embeddings.npy files are copied into one
+        float16 memory-mapped matrix, and a Parquet table records, for each row,
+        the document ID, the chunk index, and the byte offset of its line in
+        <document_id>_meta.jsonl, so queries can score the whole corpus at once
+        and only read the text of the best rows. The number of documents is
+        stored in the table's schema metadata under FILES_PROCESSED_KEY.
+        
+        The faiss index built over the previous matrix is deleted, since its
+        rows would no longer match the offsets table.
+        
+        Returns:
+            Number of rows in the consolidated matrix
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        matrix_path, offsets_path, norms_path = self._corpus_paths()
+        
+        faiss_index_path = os.path.join(self.embeddings_dir, self.FAISS_INDEX_FILE)
+        if os.path.exists(faiss_index_path):
+            os.remove(faiss_index_path)
+        
+        # Read only the .npy headers first, to size the consolidated matrix
+        shapes = []
+        for document_id in self.list_embedded_documents():
+            npy_file_path, _ = self._embeddings_paths(document_id)
+            shape = np.load(npy_file_path, mmap_mode='r').shape
+            if shape[0]:
+                shapes.append((document_id, shape))
+        if not shapes:
+            return 0
+        
+        total = sum(shape[0] for _, shape in shapes)
+        matrix = np.lib.format.open_memmap(
+            matrix_path, mode='w+', dtype=np.float16, shape=(total, shapes[0][1][1])
+        )
+        
+        norms = np.empty(total, dtype=np.float32)
+        row_document_ids = []
+        chunk_indices = []
+        line_offsets = []
+        row = 0
+        for document_id, shape in shapes:
+            matrix[row:row + shape[0]] = self.load_embeddings(document_id)["embeddings"]
+            norms[row:row + shape[0]] = np.linalg.norm(np.asarray(matrix[row:row + shape[0]], dtype=np.float32), axis=1)
+            row += shape[0]
             
-        return [
-            os.path.splitext(file)[0].replace("_embeddings", "")
-            for file in os.listdir(self.embeddings_dir)
-            if file.endswith("_embeddings.json")
-        ]
\ No newline at end of file
+            # Byte offset of each item line, skipping the header line
+            _, meta_file_path = self._embeddings_paths(document_id)
+            with open(meta_file_path, 'rb') as f:
+                offset = len(next(f))
+                for chunk_index, line in enumerate(f):
+                    row_document_ids.append(document_id)
+                    chunk_indices.append(chunk_index)
+                    line_offsets.append(offset)
+                    offset += len(line)
+        
+        matrix.flush()
+        del matrix
+        np.save(norms_path, norms)
+        
+        # The number of documents is stored with the table, so queries do not
+        # count the distinct IDs of every row
+        pq.write_table(pa.table({
+            "document_id": row_document_ids,
+            "chunk_idx": chunk_indices,
+            "line_offset": line_offsets
+        }, metadata={self.FILES_PROCESSED_KEY: str(len(shapes))}), offsets_path)
+        
+        return total
+    
+    def load_corpus_index(self) -> Optional[tuple]:
+        """
+        Loads the consolidated index built by build_corpus_index.
+        
+        Returns:
+            Tuple (matrix, offsets, norms) with the read-only memory-mapped float16
+            matrix, the offsets as a pyarrow Table, and the (N,) float32 row norms,
+            or None if no index was built
+        """
+        import pyarrow.parquet as pq
+        
+        matrix_path, offsets_path, norms_path = self._corpus_paths()
+        
+        if not all(os.path.exists(path) for path in (matrix_path, offsets_path, norms_path)):
+            return None
+        
+        return np.load(matrix_path, mmap_mode='r'), pq.read_table(offsets_path), np.load(norms_path)
+    
+    def build_faiss_index(self, index_type: str = "faiss-flat", block_rows: int = 65536) -> int:
+        """
+        Builds a faiss index over the consolidated embedding matrix.
+        
+        Rows are L2-normalized so the inner product is the cosine similarity;
+        faiss-flat does an exact scan, and faiss-hnsw an approximate HNSW search
+        suited to large corpora. Row i of the index is row i of the matrix, so
+        the offsets table of build_corpus_index maps results back to chunks.
+        
+        Args:
+            index_type: faiss-flat or faiss-hnsw
+            block_rows: Number of rows converted to float32 and added at a time
+            
+        Returns:
+            Number of vectors in the index
+        """
+        if index_type not in self.FAISS_INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        
+        import faiss
+        
+        corpus_index = self.load_corpus_index()
+        if corpus_index is None:
+            raise FileNotFoundError("Consolidated embedding index not found; run build_corpus_index first")
+        matrix = corpus_index[0]
+        
+        dimensions = matrix.shape[1]
+        if index_type == "faiss-hnsw":
+            index = faiss.IndexHNSWFlat(dimensions, 32, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexFlatIP(dimensions)
+        
+        for start in range(0, len(matrix), block_rows):
+            block = np.array(matrix[start:start + block_rows], dtype=np.float32)
+            faiss.normalize_L2(block)
+            index.add(block)
+        
+        faiss.write_index(index, os.path.join(self.embeddings_dir, self.FAISS_INDEX_FILE))
+        return index.ntotal
+    
+    def load_faiss_index(self) -> Optional["faiss.Index"]:
+        """Loads the faiss index built by build_faiss_index, or returns None if there is none."""
+        index_path = os.path.join(self.embeddings_dir, self.FAISS_INDEX_FILE)
+        
+        if not os.path.exists(index_path):
+            return None
+        
+        import faiss
+        return faiss.read_index(index_path)
+    
+    def read_embedding_item(self, document_id: str, line_offset: int) -> Dict[str, Any]:
+        """
+        Reads one item (text and metadata) of a document's embeddings sidecar.
+        
+        Args:
+            document_id: Document ID
+            line_offset: Byte offset of the item's line, as recorded by build_corpus_index
+            
+        Returns:
+            Dictionary with the item's text and metadata
+        """
+        _, meta_file_path = self._embeddings_paths(document_id)
+        
+        with open(meta_file_path, 'rb') as f:
+            f.seek(line_offset)
+            return orjson.loads(f.readline())
@@ -1,19 +1,16 @@
 import os
-import sys
 import argparse
-from pathlib import Path
+import asyncio
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import List
 import logging
+import numpy as np
 
-# Add the root directory to the Python PATH to allow relative imports
-current_dir = Path(os.path.dirname(os.path.realpath(__file__)))
-root_dir = current_dir.parent.parent
-if str(root_dir) not in sys.path:
-    sys.path.insert(0, str(root_dir))
-
-from document_processor import DocumentProcessor
+from src.data_processing.document_processor import DocumentProcessor
 from src.database import VectorStoreManager
-from json_serializer import JsonSerializer
+from src.database.vector_store import ADD_BATCH_SIZE
+from src.data_processing.json_serializer import JsonSerializer
 
 # Logging configuration
 logging.basicConfig(
@@ -25,114 +22,404 @@ logging.basicConfig(
 )
 logger = logging.getLogger("document_pipeline")
 
+# File in the vector database directory listing the IDs of ingested documents
+INGESTED_FILE = ".ingested"
+
+def load_ingested_ids(vector_store_dir: str) -> set:
+    """Returns the IDs of the documents already added to the vector database."""
+    ingested_path = os.path.join(vector_store_dir, INGESTED_FILE)
+    if not os.path.exists(ingested_path):
+        return set()
+    
+    with open(ingested_path, 'r', encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+def mark_ingested(vector_store_dir: str, document_id: str):
+    """Records that a document was added to the vector database."""
+    with open(os.path.join(vector_store_dir, INGESTED_FILE), 'a', encoding='utf-8') as f:
+        f.write(document_id + "\n")
+
+def _iter_files(directory_path: str, allowed: frozenset):
+    """
+    Recursively yields the files of a directory whose extension is allowed.
+    
+    Yields:
+        os.DirEntry of each matching file; its stat() result is cached by the entry
+    """
+    with os.scandir(directory_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_files(entry.path, allowed)
+            else:
+                dot = entry.name.rfind('.')
+                if dot >= 0 and entry.name[dot + 1:].lower() in allowed and entry.is_file():
+                    yield entry
+
+# Per-process instances reused by the parsing workers
+_worker_processor = None
+_worker_serializer = None
+
+def _worker_process(file_path: str, chunks_dir: str, embeddings_dir: str) -> tuple:
+    """
+    Processes one file into chunks; runs inside a worker process.
+    
+    Args:
+        file_path: Path of the file to process
+        chunks_dir: Directory to save chunks in JSON Lines format
+        embeddings_dir: Directory to save embeddings (.npy matrices with JSON Lines metadata)
+        
+    Returns:
+        Tuple (document_id, documents), with document_id None if the file had no content
+    """
+    global _worker_processor, _worker_serializer
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+        _worker_serializer = JsonSerializer(chunks_dir=chunks_dir, embeddings_dir=embeddings_dir)
+    
+    documents = _worker_processor.process_file(file_path)
+    if not documents:
+        return None, documents
+    return _worker_serializer.get_document_id(documents, file_path), documents
+
+class EmbeddingBatcher:
+    """
+    Groups the texts of several documents into batched embedding requests.
+    
+    Callers await embed() with the texts of one document; texts accumulate
+    until batch_size is reached or max_wait seconds pass, and are then sent in
+    requests of at most batch_size texts, with up to max_concurrency requests
+    in flight. Each caller gets back the embeddings of its own texts.
+    """
+    
+    def __init__(self, vector_store: VectorStoreManager, batch_size: int = 1000,
+                 max_concurrency: int = 8, max_wait: float = 0.05):
+        """
+        Initializes the batcher.
+        
+        Args:
+            vector_store: Vector store manager providing the embedding function
+            batch_size: Maximum number of texts per embedding request
+            max_concurrency: Maximum number of in-flight embedding requests
+            max_wait: Seconds to wait for more texts before sending a partial batch
+        """
+        self.vector_store = vector_store
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending = []
+        self._pending_count = 0
+        self._timer = None
+        self._tasks = set()
+    
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generates the embeddings of one document's texts as part of a batch.
+        
+        Args:
+            texts: List of strings to generate embeddings for
+            
+        Returns:
+            List of embedding vectors, in the order of texts
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((texts, future))
+        self._pending_count += len(texts)
+        
+        if self._pending_count >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        """Sends the pending texts as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        pending, self._pending, self._pending_count = self._pending, [], 0
+        if pending:
+            task = asyncio.get_running_loop().create_task(self._send(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _send(self, pending: list):
+        """Embeds a batch in requests of at most batch_size texts and scatters the results."""
+        texts = [text for document_texts, _ in pending for text in document_texts]
+        
+        async def embed_slice(start: int) -> List[List[float]]:
+            async with self._semaphore:
+                return await self.vector_store.aget_embeddings(texts[start:start + self.batch_size])
+        
+        try:
+            slices = await asyncio.gather(*[embed_slice(start) for start in range(0, len(texts), self.batch_size)])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        embeddings = [embedding for embedding_slice in slices for embedding in embedding_slice]
+        offset = 0
+        for document_texts, future in pending:
+            if not future.done():
+                future.set_result(embeddings[offset:offset + len(document_texts)])
+            offset += len(document_texts)
+
+async def ingest_files(file_stats: dict, json_serializer: JsonSerializer, vector_store: VectorStoreManager,
+                       vector_store_dir: str, manifest: dict, skip_existing: bool = True,
+                       max_concurrency: int = 8, persist_intermediate: bool = False,
+                       embedding_batch_size: int = 1000, max_files_in_flight: int = None) -> List[str]:
+    """
+    Runs each file through parsing, embedding, and vector database insertion.
+    
+    Files flow through the stages independently: parsing runs in a process pool,
+    the chunks of several files are batched into embedding requests (up to
+    max_concurrency of them in flight), and documents are inserted in batches
+    of at least ADD_BATCH_SIZE rows, one batch at a time on a dedicated thread.
+    Chunks and embeddings are handed between stages in memory; when
+    persist_intermediate is set they are also written to disk on a background
+    thread.
+    
+    With skip_existing, documents already listed in the vector database's
+    .ingested file are not embedded or added again, and embeddings saved by a
+    previous run are reused instead of being requested again.
+    
+    Args:
+        file_stats: Mapping of each file path to process to its (size, mtime)
+        json_serializer: Serializer used for the manifest and intermediate files
+        vector_store: Vector store manager providing embeddings and storage
+        vector_store_dir: Directory of the vector database, holding the .ingested file
+        manifest: Manifest of ingested files, updated in place
+        skip_existing: Skip the work already done for a document by a previous run
+        max_concurrency: Maximum number of in-flight embedding requests
+        persist_intermediate: Also save chunks and embeddings to disk
+        embedding_batch_size: Maximum number of texts per embedding request
+        max_files_in_flight: Maximum number of files between parsing and insertion
+            at once (default: twice the number of CPUs)
+        
+    Returns:
+        IDs of the documents added to the vector database
+    """
+    loop = asyncio.get_running_loop()
+    batcher = EmbeddingBatcher(vector_store, batch_size=embedding_batch_size, max_concurrency=max_concurrency)
+    ingested = load_ingested_ids(vector_store_dir) if skip_existing else set()
+    document_ids = []
+    writes = []
+    
+    # Documents waiting to be inserted together, and the batch being inserted
+    pending_inserts = []
+    pending_rows = 0
+    current_insert = None
+    insert_lock = asyncio.Lock()
+    
+    def insert_batch(batch: list):
+        """Adds a batch of documents in one call; runs on db_writer."""
+        # Stack the vectors into one float32 array, whether they came from the API or from disk
+        vectors = [np.asarray(embeddings, dtype=np.float32) for _, _, _, embeddings, _ in batch if len(embeddings)]
+        vector_store.add_documents_with_embeddings(
+            texts=[text for _, _, texts, _, _ in batch for text in texts],
+            embeddings=np.concatenate(vectors) if vectors else [],
+            metadatas=[metadata for _, _, _, _, metadatas in batch for metadata in metadatas],
+            ids=[f"{document_id}_{i}" for _, document_id, texts, _, _ in batch for i in range(len(texts))]
+        )
+    
+    def record_insert(added: list, insert: asyncio.Future):
+        """Records the documents of a finished insert in the manifest; runs on the event loop."""
+        error = insert.exception()
+        if error:
+            logger.error(f"Error adding {len(added)} documents to vector database: {str(error)}")
+            return
+        
+        for file_path, document_id in added:
+            logger.info(f"STEP 3 - Document {document_id} added to vector database.")
+            manifest[file_path] = [*file_stats[file_path], document_id]
+            document_ids.append(document_id)
+    
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as parser_pool, \
+            ThreadPoolExecutor(max_workers=1) as db_writer, \
+            ThreadPoolExecutor(max_workers=1) as disk_writer:
+        
+        async def flush_inserts():
+            """Submits the pending documents once the previous batch was inserted."""
+            nonlocal pending_inserts, pending_rows, current_insert
+            async with insert_lock:
+                batch, pending_inserts, pending_rows = pending_inserts, [], 0
+                if not batch:
+                    return
+                
+                # Only one batch is held for insertion at a time; waiting here also
+                # slows the producers down when the database is the bottleneck
+                if current_insert is not None:
+                    await asyncio.wait([current_insert])
+                
+                # Only the file paths and IDs are kept past the insert, not the batch
+                current_insert = loop.run_in_executor(db_writer, insert_batch, batch)
+                current_insert.add_done_callback(functools.partial(
+                    record_insert, [(file_path, document_id) for file_path, document_id, _, _, _ in batch]
+                ))
+        
+        async def ingest_one(file_path: str):
+            nonlocal pending_rows
+            try:
+                # Step 1: Process the document into chunks
+                document_id, documents = await loop.run_in_executor(
+                    parser_pool, _worker_process, file_path, json_serializer.chunks_dir, json_serializer.embeddings_dir
+                )
+                if not document_id:
+                    return
+                logger.info(f"STEP 1 - {file_path} split into {len(documents)} chunks with ID: {document_id}")
+                
+                # The content is unchanged even if the file's stat is not
+                if document_id in ingested:
+                    logger.info(f"Document {document_id} is already in the vector database, skipping.")
+                    manifest[file_path] = [*file_stats[file_path], document_id]
+                    return
+                
+                texts = [doc.page_content for doc in documents]
+                metadatas = [doc.metadata for doc in documents]
+                
+                # Step 2: Generate embeddings, batched with the chunks of other files,
+                # unless a previous run saved them for the same chunk texts
+                embeddings = None
+                if skip_existing and await asyncio.to_thread(json_serializer.has_embeddings_for, document_id, texts):
+                    embeddings = (await asyncio.to_thread(json_serializer.load_embeddings, document_id))["embeddings"]
+                    logger.info(f"STEP 2 - Embeddings loaded from disk for document: {document_id}")
+                
+                # Saved chunks are kept only along with the embeddings they match
+                if persist_intermediate and (embeddings is None or not json_serializer.has_chunks(document_id)):
+                    writes.append(disk_writer.submit(
+                        json_serializer.save_chunks, documents, file_path, document_id
+                    ))
+                
+                if embeddings is None:
+                    embeddings = await batcher.embed(texts)
+                    logger.info(f"STEP 2 - Embeddings generated for document: {document_id}")
+                    
+                    if persist_intermediate:
+                        writes.append(disk_writer.submit(
+                            json_serializer.save_embeddings, document_id, embeddings, texts, metadatas
+                        ))
+                
+                # Step 3: Queue the document for the vector database, adding batches
+                # of at least ADD_BATCH_SIZE rows in one call
+                pending_inserts.append((file_path, document_id, texts, embeddings, metadatas))
+                pending_rows += len(texts)
+                if pending_rows >= ADD_BATCH_SIZE:
+                    await flush_inserts()
+                
+            except Exception as e:
+                logger.error(f"Error ingesting {file_path}: {str(e)}")
+        
+        # A fixed number of workers pull files one at a time, so only
+        # max_files_in_flight files are held in memory at once
+        file_paths = iter(file_stats)
+        
+        async def ingest_worker():
+            for file_path in file_paths:
+                await ingest_one(file_path)
+        
+        await asyncio.gather(*[ingest_worker() for _ in range(max_files_in_flight or 2 * os.cpu_count())])
+        await flush_inserts()
+        if current_insert is not None:
+            await asyncio.wait([current_insert])
+    
+    # The database is written once, after every batch was added; documents are
+    # only recorded as ingested once they are saved
+    vector_store.flush()
+    for document_id in document_ids:
+        mark_ingested(vector_store_dir, document_id)
+    
+    # Leaving the with block waited for the pending writes; report any that failed
+    for write in writes:
+        error = write.exception()
+        if error:
+            logger.error(f"Error saving intermediate files: {str(error)}")
+    
+    return document_ids
+
 def process_directory(directory_path: str, extensions: List[str] = None, 
                      chunks_dir: str = "chunks", embeddings_dir: str = "embeddings", 
-                     vector_store_dir: str = "chroma_db", skip_existing: bool = True):
+                     vector_store_dir: str = "chroma_db", skip_existing: bool = True,
+                     max_concurrent_embeddings: int = 8, embedding_dtype: str = "float16",
+                     persist_intermediate: bool = False, embedding_batch_size: int = 1000,
+                     index_type: str = None):
     """
-    Processes all supported documents in a directory with intermediate steps.
+    Processes all supported documents in a directory and adds them to the vector database.
     
     Args:
         directory_path: Path to the directory containing the documents
         extensions: List of file extensions to process (default: txt, html, htm, pdf)
-        chunks_dir: Directory to save chunks in JSON format
-        embeddings_dir: Directory to save embeddings in JSON format
+        chunks_dir: Directory to save chunks in JSON Lines format, and the manifest of ingested files
+        embeddings_dir: Directory to save embeddings (.npy matrices with JSON Lines metadata)
         vector_store_dir: Directory for the vector database
-        skip_existing: Skip already processed files
+        skip_existing: Skip files that are unchanged since they were last ingested,
+            according to the manifest kept in chunks_dir, and whose document is
+            listed in the vector database's .ingested file
+        max_concurrent_embeddings: Maximum number of in-flight embedding requests
+        embedding_dtype: Storage type of the saved embeddings (float32, float16, or int8)
+        persist_intermediate: Also save chunks and embeddings to chunks_dir and embeddings_dir
+        embedding_batch_size: Maximum number of texts per embedding request
+        index_type: Also build a faiss index (faiss-flat or faiss-hnsw) over the saved
+            embeddings; requires persist_intermediate
     """
     if not extensions:
         extensions = ['txt', 'html', 'htm', 'pdf']
     
-    document_processor = DocumentProcessor()
-    json_serializer = JsonSerializer(chunks_dir=chunks_dir, embeddings_dir=embeddings_dir)
+    json_serializer = JsonSerializer(chunks_dir=chunks_dir, embeddings_dir=embeddings_dir,
+                                     embedding_dtype=embedding_dtype)
     vector_store = VectorStoreManager(persist_directory=vector_store_dir)
     
-    processed_files = 0
-    processed_document_ids = []
-    
     logger.info(f"Starting document processing in: {directory_path}")
     
-    # Step 1: Process documents and save chunks in JSON
-    for root, _, files in os.walk(directory_path):
-        for file in files:
-            extension = file.split('.')[-1].lower()
-            if extension in extensions:
-                file_path = os.path.join(root, file)
-                try:
-                    logger.info(f"STEP 1 - Processing file: {file_path}")
-                    
-                    # Process the document
-                    documents = document_processor.process_file(file_path)
-                    
-                    # Save chunks in JSON
-                    document_id = json_serializer.save_chunks(documents, file_path)
-                    if document_id:
-                        logger.info(f"Chunks saved with ID: {document_id}")
-                        processed_document_ids.append(document_id)
-                        processed_files += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error processing {file_path}: {str(e)}")
+    manifest = json_serializer.load_manifest()
+    ingested = load_ingested_ids(vector_store_dir) if skip_existing else set()
+    allowed = frozenset(extension.lower().lstrip('.') for extension in extensions)
+    file_stats = {}
+    skipped_files = 0
+    for file_entry in _iter_files(directory_path, allowed):
+        file_path = file_entry.path
+        stat = file_entry.stat()
+        
+        # Unchanged files were already added to this vector database by a previous
+        # run; the manifest is shared by every database built from chunks_dir
+        entry = manifest.get(file_path)
+        if skip_existing and entry and entry[:2] == [stat.st_size, stat.st_mtime] and entry[2] in ingested:
+            skipped_files += 1
+            continue
+        
+        file_stats[file_path] = (stat.st_size, stat.st_mtime)
     
-    logger.info(f"STEP 1 completed. {processed_files} files were processed.")
+    logger.info(f"Processing {len(file_stats)} files ({skipped_files} unchanged files skipped)")
     
-    # Step 2: Generate embeddings and save them in JSON
-    for document_id in processed_document_ids:
-        try:
-            logger.info(f"STEP 2 - Generating embeddings for document: {document_id}")
-            
-            # Load chunks from JSON file
-            documents = json_serializer.load_chunks(document_id)
-            
-            # Prepare data for embeddings
-            texts = [doc.page_content for doc in documents]
-            metadatas = [doc.metadata for doc in documents]
-            
-            # Generate embeddings
-            embeddings = vector_store.get_embeddings(texts)
-            
-            # Save embeddings in JSON
-            embedding_path = json_serializer.save_embeddings(
-                document_id=document_id, 
-                embeddings=embeddings, 
-                texts=texts, 
-                metadatas=metadatas
-            )
-            
-            logger.info(f"Embeddings saved in: {embedding_path}")
-            
-        except Exception as e:
-            logger.error(f"Error generating embeddings for {document_id}: {str(e)}")
+    processed_document_ids = asyncio.run(ingest_files(
+        file_stats, json_serializer, vector_store, vector_store_dir, manifest,
+        skip_existing=skip_existing, max_concurrency=max_concurrent_embeddings, persist_intermediate=persist_intermediate,
+        embedding_batch_size=embedding_batch_size
+    ))
     
-    logger.info("STEP 2 completed. Embeddings generated and saved.")
+    json_serializer.save_manifest(manifest)
     
-    # Step 3: Add to the vector database
-    for document_id in processed_document_ids:
-        try:
-            logger.info(f"STEP 3 - Adding to vector database: {document_id}")
-            
-            # Load embeddings from JSON file
-            embedding_data = json_serializer.load_embeddings(document_id)
-            
-            # Add to the vector database using precomputed embeddings
-            vector_store.add_documents_with_embeddings(
-                texts=embedding_data["texts"],
-                embeddings=embedding_data["embeddings"],
-                metadatas=embedding_data["metadatas"]
-            )
-            
-            logger.info(f"Document {document_id} added to vector database.")
-            
-        except Exception as e:
-            logger.error(f"Error adding {document_id} to vector database: {str(e)}")
+    # Consolidate the saved embeddings so JSON-file queries scan a single matrix
+    if persist_intermediate:
+        rows = json_serializer.build_corpus_index()
+        logger.info(f"Consolidated embedding index rebuilt with {rows} rows.")
+        
+        if index_type and rows:
+            vectors = json_serializer.build_faiss_index(index_type)
+            logger.info(f"{index_type} index built with {vectors} vectors.")
     
-    logger.info("STEP 3 completed. Documents added to vector database.")
+    logger.info(f"Processing completed. {len(processed_document_ids)} documents added to vector database.")
     
     # Display database statistics
     stats = vector_store.get_collection_stats()
     logger.info(f"Database statistics: {stats}")
     
     return {
-        "processed_files": processed_files,
+        "processed_files": len(processed_document_ids),
+        "skipped_files": skipped_files,
         "document_ids": processed_document_ids
     }
 
@@ -140,14 +427,27 @@ def process_directory(directory_path: str, extensions: List[str] = None,
 def main():
     parser = argparse.ArgumentParser(description='Document processing pipeline to create a vector database')
     parser.add_argument('--dir', type=str, default='data_raw', help='Directory containing the documents to process')
-    parser.add_argument('--chunks_dir', type=str, default='chunks', help='Directory to save chunks in JSON format')
-    parser.add_argument('--embeddings_dir', type=str, default='embeddings', help='Directory to save embeddings in JSON format')
+    parser.add_argument('--chunks_dir', type=str, default='chunks', help='Directory to save chunks in JSON Lines format')
+    parser.add_argument('--embeddings_dir', type=str, default='embeddings', help='Directory to save embeddings (.npy matrices with JSON Lines metadata)')
     parser.add_argument('--db_dir', type=str, default='chroma_db', help='Directory to store the vector database')
     parser.add_argument('--extensions', type=str, default='txt,htm,pdf', help='File extensions to process (comma-separated)')
-    parser.add_argument('--skip_existing', action='store_false', help='Skip already processed files')
+    parser.add_argument('--skip_existing', action='store_false',
+                        help='Reprocess files even if they are unchanged since the last run')
     parser.add_argument('--query', type=str, help='Query to test the database (optional)')
+    parser.add_argument('--max_concurrent_embeddings', type=int, default=8,
+                        help='Maximum number of concurrent embedding requests')
+    parser.add_argument('--embedding_dtype', type=str, choices=['float32', 'float16', 'int8'], default='float16',
+                        help='Storage type of the saved embeddings')
+    parser.add_argument('--embedding_batch_size', type=int, default=1000,
+                        help='Maximum number of texts per embedding request')
+    parser.add_argument('--persist_intermediate', action='store_true',
+                        help='Also save chunks and embeddings to disk')
+    parser.add_argument('--index', type=str, choices=['faiss-flat', 'faiss-hnsw'],
+                        help='Also build a faiss index over the saved embeddings (requires --persist_intermediate)')
     
     args = parser.parse_args()
+    if args.index and not args.persist_intermediate:
+        parser.error("--index requires --persist_intermediate")
     
     # Check if the document directory exists
     if not os.path.exists(args.dir):
@@ -162,7 +462,12 @@ def main():
         chunks_dir=args.chunks_dir,
         embeddings_dir=args.embeddings_dir,
         vector_store_dir=args.db_dir,
-        skip_existing=args.skip_existing
+        skip_existing=args.skip_existing,
+        max_concurrent_embeddings=args.max_concurrent_embeddings,
+        embedding_dtype=args.embedding_dtype,
+        persist_intermediate=args.persist_intermediate,
+        embedding_batch_size=args.embedding_batch_size,
+        index_type=args.index
     )
     
     logger.info(f"Processing completed. {len(result['document_ids'])} documents processed.")
@@ -1,18 +1,17 @@
 import argparse
-import json
 import os
 import sys
-from pathlib import Path
+import heapq
 import logging
-
-# Add the root directory to the Python PATH to allow relative imports
-current_dir = Path(os.path.dirname(os.path.realpath(__file__)))
-root_dir = current_dir.parent.parent
-if str(root_dir) not in sys.path:
-    sys.path.insert(0, str(root_dir))
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import orjson
 
 from src.database import VectorStoreManager
-from json_serializer import JsonSerializer
+from src.data_processing.json_serializer import JsonSerializer
+from src.data_processing._cosine_jit import cosine_topk, cosine_topk_with_norms
 
 # Basic logging configuration
 logging.basicConfig(
@@ -29,27 +28,45 @@ def format_document(doc, index):
         "metadata": doc.metadata
     }
 
-def query_from_vector_db(db_dir, query, k, with_score=False):
-    """Performs a query directly from the vector database."""
-    
-    # Check if the database directory exists
-    if not os.path.exists(db_dir):
-        raise FileNotFoundError(f"The database directory '{db_dir}' was not found.")
+@functools.lru_cache(maxsize=8)
+def _get_store(db_dir):
+    """Returns the vector database manager for a directory, created once per directory."""
+    return VectorStoreManager(persist_directory=db_dir)
+
+def iter_vector_db_results(vector_store, query, k, with_score=False):
+    """
+    Yields formatted query results from the vector database one at a time.
     
-    vector_store = VectorStoreManager(persist_directory=db_dir)
+    Args:
+        vector_store (VectorStoreManager): Manager of the vector database to search
+        query (str): Query to be performed
+        k (int): Number of results to return
+        with_score (bool): Include similarity score in the results
     
+    Yields:
+        Formatted result dicts, best match first
+    """
     if with_score:
-        results = vector_store.search_with_score(query, k=k)
-        formatted_results = []
-        
-        for i, (doc, score) in enumerate(results):
+        for i, (doc, score) in enumerate(vector_store.search_with_score(query, k=k)):
             result = format_document(doc, i+1)
             result["score"] = score
-            formatted_results.append(result)
+            yield result
     else:
-        results = vector_store.search(query, k=k)
-        formatted_results = [format_document(doc, i+1) for i, doc in enumerate(results)]
-        
+        for i, doc in enumerate(vector_store.search(query, k=k)):
+            yield format_document(doc, i+1)
+
+def _open_vector_db(db_dir):
+    """Returns the manager of an existing vector database directory."""
+    # Check if the database directory exists
+    if not os.path.exists(db_dir):
+        raise FileNotFoundError(f"The database directory '{db_dir}' was not found.")
+    
+    return _get_store(db_dir)
+
+def query_from_vector_db(db_dir, query, k, with_score=False):
+    """Performs a query directly from the vector database."""
+    vector_store = _open_vector_db(db_dir)
+    formatted_results = list(iter_vector_db_results(vector_store, query, k, with_score))
     return formatted_results, vector_store.get_collection_stats()
 
 def list_embeddings_files(embeddings_dir):
@@ -57,64 +74,173 @@ def list_embeddings_files(embeddings_dir):
     if not os.path.exists(embeddings_dir):
         return []
     
-    return [f for f in os.listdir(embeddings_dir) if f.endswith("_embeddings.json")]
+    with os.scandir(embeddings_dir) as entries:
+        return [entry.name for entry in entries if entry.name.endswith("_embeddings.npy") and entry.is_file()]
 
-def query_from_json_files(chunks_dir, embeddings_dir, query, k):
-    """Performs a query directly from JSON embedding files."""
+# Number of rows of the consolidated matrix converted to float32 at a time
+CORPUS_BLOCK_ROWS = 65536
+
+# Number of threads loading embedding files ahead of the scoring loop
+LOAD_THREADS = 8
+
+def _load_embedding_file(json_serializer, document_id):
+    """Loads a document's embeddings as a contiguous float32 matrix, reading it fully from disk."""
+    embedding_data = json_serializer.load_embeddings(document_id)
+    embedding_data["embeddings"] = np.ascontiguousarray(embedding_data["embeddings"], dtype=np.float32)
+    return embedding_data
+
+def _iter_embedding_files(json_serializer, document_ids, max_workers=LOAD_THREADS):
+    """
+    Loads embedding files in background threads while the caller scores the previous ones.
+    
+    Yields (document_id, future) pairs in order, keeping at most 2 * max_workers
+    files loaded or in flight at a time.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        window = deque()
+        for document_id in document_ids:
+            window.append((document_id, executor.submit(_load_embedding_file, json_serializer, document_id)))
+            if len(window) >= 2 * max_workers:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
+
+def _query_corpus_index(json_serializer, corpus_index, query_embedding, k):
+    """Scores the consolidated embedding matrix and reads the text of the top k rows only."""
+    matrix, offsets, norms = corpus_index
+    
+    # Top k of each block, converted to float32 one block at a time to bound the copies
+    candidate_rows = []
+    candidate_similarities = []
+    for start in range(0, len(matrix), CORPUS_BLOCK_ROWS):
+        block = np.ascontiguousarray(matrix[start:start + CORPUS_BLOCK_ROWS], dtype=np.float32)
+        block_norms = np.ascontiguousarray(norms[start:start + len(block)])
+        rows, similarities = cosine_topk_with_norms(block, query_embedding, block_norms, k)
+        candidate_rows.append(rows + start)
+        candidate_similarities.append(similarities)
+    
+    # Merge the per-block candidates into the global top k
+    candidate_rows = np.concatenate(candidate_rows)
+    candidate_similarities = np.concatenate(candidate_similarities)
+    order = np.argsort(candidate_similarities)[::-1][:k]
+    
+    return _format_corpus_results(
+        json_serializer, offsets, candidate_rows[order], candidate_similarities[order], len(matrix)
+    )
+
+def _query_faiss_index(json_serializer, faiss_index, offsets, query_embedding, k):
+    """Searches the faiss index and reads the text of the returned rows only."""
+    similarities, rows = faiss_index.search(query_embedding[None, :], k)
+    found = rows[0] >= 0
+    
+    return _format_corpus_results(
+        json_serializer, offsets, rows[0][found], similarities[0][found], faiss_index.ntotal
+    )
+
+def _format_corpus_results(json_serializer, offsets, top, top_similarities, total_embeddings):
+    """Formats the top rows of the consolidated index, reading their text from the sidecars."""
+    document_ids = offsets.column("document_id")
+    line_offsets = offsets.column("line_offset")
+    formatted_results = []
+    for i, (row, similarity) in enumerate(zip(top.tolist(), top_similarities.tolist())):
+        document_id = document_ids[row].as_py()
+        item = json_serializer.read_embedding_item(document_id, line_offsets[row].as_py())
+        formatted_results.append({
+            "index": i+1,
+            "content": item["text"],
+            "metadata": item["metadata"],
+            "score": similarity,
+            "document_id": document_id
+        })
+    
+    # Recorded by build_corpus_index; older indexes are counted without building a Python set
+    metadata = offsets.schema.metadata or {}
+    if json_serializer.FILES_PROCESSED_KEY in metadata:
+        files_processed = int(metadata[json_serializer.FILES_PROCESSED_KEY])
+    else:
+        import pyarrow.compute as pc
+        files_processed = pc.count_distinct(document_ids).as_py()
+    
+    stats = {
+        "total_embeddings": total_embeddings,
+        "files_processed": files_processed
+    }
+    
+    return formatted_results, stats
+
+def query_from_json_files(chunks_dir, embeddings_dir, query, k, index="matrix"):
+    """
+    Performs a query directly from the saved embedding files.
+    
+    With index="faiss", the faiss index built by the pipeline is searched
+    instead of scanning the embedding matrices.
+    """
     # Initialize the JSON serializer
     json_serializer = JsonSerializer(chunks_dir=chunks_dir, embeddings_dir=embeddings_dir)
     
     # Initialize the vector database manager (only to use the embedding function)
     vector_store = VectorStoreManager()
     
-    # Get the query embedding
-    query_embedding = vector_store.get_embeddings([query])[0]
+    # Get the query embedding, normalized once for cosine similarity
+    query_embedding = np.asarray(vector_store.get_embeddings([query])[0], dtype=np.float32)
+    query_embedding /= np.linalg.norm(query_embedding) + 1e-12
     
-    # List of results with scores
-    all_results = []
+    # Use the consolidated index when the pipeline built one
+    corpus_index = json_serializer.load_corpus_index()
+    if index == "faiss":
+        faiss_index = json_serializer.load_faiss_index()
+        # An index built over an older consolidated matrix maps to the wrong rows
+        if faiss_index is None or corpus_index is None or faiss_index.ntotal != len(corpus_index[1]):
+            raise FileNotFoundError(f"No faiss index found in '{embeddings_dir}'; build it with main.py --index")
+        logger.info(f"Querying faiss index with {faiss_index.ntotal} embeddings")
+        return _query_faiss_index(json_serializer, faiss_index, corpus_index[1], query_embedding, k)
     
-    # Function to calculate cosine similarity
-    def cosine_similarity(v1, v2):
-        import numpy as np
-        v1 = np.array(v1)
-        v2 = np.array(v2)
-        return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
+    if corpus_index is not None:
+        logger.info(f"Querying consolidated index with {len(corpus_index[0])} embeddings")
+        return _query_corpus_index(json_serializer, corpus_index, query_embedding, k)
     
-    # List all JSON embedding files
+    # Min-heap of the k best results so far, as (similarity, tiebreaker, result)
+    top_heap = []
+    total_embeddings = 0
+    
+    # List all saved embedding files
     embedding_files = list_embeddings_files(embeddings_dir)
     logger.info(f"Found {len(embedding_files)} embedding files for query")
     
-    # Process each embedding file
-    for embedding_file in embedding_files:
-        document_id = embedding_file.replace("_embeddings.json", "")
+    # Process each embedding file; files are read ahead in background threads
+    # while the current one is scored
+    document_ids = [embedding_file[:-len("_embeddings.npy")] for embedding_file in embedding_files]
+    for document_id, loading in _iter_embedding_files(json_serializer, document_ids):
         try:
-            # Load embeddings from the JSON file
-            embedding_data = json_serializer.load_embeddings(document_id)
+            embedding_data = loading.result()
             
-            # Calculate similarity for each embedding
-            for i, (text, metadata, embedding) in enumerate(zip(
-                embedding_data["texts"], 
-                embedding_data["metadatas"], 
-                embedding_data["embeddings"]
-            )):
-                # Calculate similarity
-                similarity = cosine_similarity(query_embedding, embedding)
-                
-                # Add to the results list
-                all_results.append({
-                    "text": text,
-                    "metadata": metadata,
+            # Only the file's own top k can enter the global top k; the compiled
+            # kernel scores every row and selects them in one pass, reusing the
+            # saved norms when the file has them
+            matrix = embedding_data["embeddings"]
+            if embedding_data["norms"] is not None:
+                candidates, similarities = cosine_topk_with_norms(matrix, query_embedding, embedding_data["norms"], k)
+            else:
+                candidates, similarities = cosine_topk(matrix, query_embedding, k)
+            
+            for i, similarity in zip(candidates.tolist(), similarities.tolist()):
+                entry = (similarity, total_embeddings + i, {
+                    "text": embedding_data["texts"][i],
+                    "metadata": embedding_data["metadatas"][i],
                     "similarity": similarity,
                     "document_id": document_id
                 })
+                if len(top_heap) < k:
+                    heapq.heappush(top_heap, entry)
+                elif entry[0] > top_heap[0][0]:
+                    heapq.heapreplace(top_heap, entry)
+            
+            total_embeddings += len(matrix)
         except Exception as e:
-            logger.error(f"Error processing file {embedding_file}: {str(e)}")
-    
-    # Sort by similarity (highest to lowest)
-    all_results.sort(key=lambda x: x["similarity"], reverse=True)
+            logger.error(f"Error processing embeddings of {document_id}: {str(e)}")
     
-    # Take only the top k results
-    top_results = all_results[:k]
+    # Sort the top k results by similarity (highest to lowest)
+    top_results = [result for _, _, result in sorted(top_heap, reverse=True)]
     
     # Format results
     formatted_results = []
@@ -130,7 +256,7 @@ def query_from_json_files(chunks_dir, embeddings_dir, query, k):
     
     # Statistics
     stats = {
-        "total_embeddings": len(all_results),
+        "total_embeddings": total_embeddings,
         "files_processed": len(embedding_files)
     }
     
@@ -167,20 +293,23 @@ def main():
     parser = argparse.ArgumentParser(description='Tool for querying the vector database or JSON embedding files')
     parser.add_argument('--db_dir', type=str, default='chroma_db', help='Directory of the vector database')
     parser.add_argument('--chunks_dir', type=str, default='chunks', help='Directory of JSON chunks')
-    parser.add_argument('--embeddings_dir', type=str, default='embeddings', help='Directory of JSON embeddings')
+    parser.add_argument('--embeddings_dir', type=str, default='embeddings', help='Directory of saved embeddings (.npy files)')
     parser.add_argument('--query', type=str, required=True, help='Query to search')
     parser.add_argument('--k', type=int, default=5, help='Number of results to return')
     parser.add_argument('--with_score', action='store_true', help='Include similarity score in the results')
     parser.add_argument('--output', type=str, choices=['text', 'json'], default='text', help='Output format')
     parser.add_argument('--source', type=str, choices=['db', 'json'], default='db', 
                         help='Query source: vector database (db) or JSON files (json)')
+    parser.add_argument('--index', type=str, choices=['matrix', 'faiss'], default='matrix',
+                        help='Search method for JSON files: scan the embedding matrices or use the faiss index')
 
     args = parser.parse_args()
     
     # Perform the query on the appropriate source
     if args.source == 'db':
-        formatted_results, stats = query_from_vector_db(
-            db_dir=args.db_dir, 
+        vector_store = _open_vector_db(args.db_dir)
+        formatted_results = iter_vector_db_results(
+            vector_store,
             query=args.query, 
             k=args.k, 
             with_score=args.with_score
@@ -191,15 +320,21 @@ def main():
             chunks_dir=args.chunks_dir, 
             embeddings_dir=args.embeddings_dir, 
             query=args.query, 
-            k=args.k
+            k=args.k,
+            index=args.index
         )
         source_name = "JSON embedding files"
     
     # Display results
     if args.output == 'json':
-        print(json.dumps(formatted_results, ensure_ascii=False, indent=2, default=str))
+        # orjson serializes the whole list in one native pass, already UTF-8 encoded
+        sys.stdout.buffer.write(orjson.dumps(
+            list(formatted_results),
+            default=str,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+        ))
     else:
-        # Text formatted output
+        # Text formatted output, printed as each result is produced
         print(f"\nResults for query: '{args.query}' (via {source_name})\n")
         
         for result in formatted_results:
@@ -219,10 +354,11 @@ def main():
     
     # Display statistics
     if args.output == 'text':
+        if args.source == 'db':
+            stats = vector_store.get_collection_stats()
         print(f"\nQuery statistics:")
         for key, value in stats.items():
             print(f"  {key}: {value}")
 
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
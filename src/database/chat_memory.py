@@ -1,14 +1,24 @@
+import atexit
 import sqlite3
-import os
-import sys
-from pathlib import Path
-# Add the root directory to the Python PATH to allow relative imports when the script is executed directly
-current_dir = Path(os.path.dirname(os.path.realpath(__file__)))
-root_dir = current_dir.parent.parent
-if str(root_dir) not in sys.path:
-    sys.path.insert(0, str(root_dir))
+import threading
 from src.config.settings import DB_PATH
 
+# Connection to the agent's database, opened on first use and shared by every
+# call; the lock serializes its use across threads
+_conn = None
+_conn_lock = threading.Lock()
+
+def _get_connection():
+    """Returns the shared database connection, opening it on first use; call with _conn_lock held."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        # Same journal mode as the agent's checkpointer, so clearing does not block its writes
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        atexit.register(_conn.close)
+    return _conn
+
 def clear_agent_memory(thread_id=None):
     """
     Clears the agent's memory stored in the SQLite database.
@@ -21,34 +31,30 @@ def clear_agent_memory(thread_id=None):
         int: Number of records removed
     """
     try:
-        # Uses the same connection as the agent
-        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        cursor = conn.cursor()
-        
-        # Check if the tables exist
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = [table[0] for table in cursor.fetchall()]
-        
-        records_removed = 0
-        
-        if 'checkpoints' in tables:
-            if thread_id:
-                # Remove only records from the specific thread
-                cursor.execute("DELETE FROM checkpoints WHERE config LIKE ?", (f'%"thread_id": "{thread_id}"%',))
-            else:
-                # Remove all records
-                cursor.execute("DELETE FROM checkpoints")
-            records_removed += cursor.rowcount
-        
-        if 'events' in tables:
-            if thread_id:
-                cursor.execute("DELETE FROM events WHERE config LIKE ?", (f'%"thread_id": "{thread_id}"%',))
-            else:
-                cursor.execute("DELETE FROM events")
-            records_removed += cursor.rowcount
+        with _conn_lock:
+            # Uses the same database as the agent
+            conn = _get_connection()
+            
+            records_removed = 0
             
-        conn.commit()
-        conn.close()
+            # Both deletes run in one transaction. The checkpointer stores
+            # checkpoints and their pending writes in two tables whose primary
+            # keys start with thread_id, so deleting a thread is an index lookup
+            with conn:
+                for table in ('checkpoints', 'writes'):
+                    try:
+                        if thread_id:
+                            # Remove only records from the specific thread
+                            cursor = conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+                        else:
+                            # Remove all records
+                            cursor = conn.execute(f"DELETE FROM {table}")
+                    except sqlite3.OperationalError as e:
+                        # The table is created by the checkpointer on first use
+                        if "no such table" not in str(e):
+                            raise
+                        continue
+                    records_removed += cursor.rowcount
         
         return records_removed
     except Exception as e:
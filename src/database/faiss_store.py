@@ -0,0 +1,228 @@
+"""
+FAISS vector store with an SQLite sidecar for the document texts and metadata.
+"""
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Any, Tuple
+
+import faiss
+import numpy as np
+import orjson
+from langchain.docstore.document import Document
+
+# Neighbors per node of the HNSW graph
+HNSW_M = 32
+
+# The index is rebuilt from the live vectors on persist once replaced vectors
+# make up this fraction of it (and number at least COMPACT_MIN_ORPHANS)
+COMPACT_ORPHAN_RATIO = 0.25
+COMPACT_MIN_ORPHANS = 1000
+
+class FaissVectorStore:
+    """
+    Vector store keeping the vectors in a FAISS HNSW index and the documents in SQLite.
+    
+    Each vector is stored in the index under the vector_id of its row in the
+    sidecar table; IDs are never reused. Replacing a document deletes its old
+    row, and the old vector no longer resolves to a document until the index
+    is compacted.
+    
+    Upserts update the index in memory and the sidecar inside an open
+    transaction, which persist() commits right after writing the index, so a
+    crash before persist() leaves both at their last saved state. The saved
+    index is memory-mapped for searching, reopened when another process saves
+    a new one, and only loaded in full when vectors are added.
+    
+    Vectors are expected to be L2-normalized, as OpenAI embeddings are, so the
+    index ranks them by inner product. Scores are reported as squared L2
+    distances, like Chroma's default, so lower is better.
+    """
+    INDEX_FILE = "faiss.index"
+    DOCS_FILE = "faiss_docs.sqlite3"
+    
+    name = "faiss"
+    
+    def __init__(self, persist_directory: str, embed_query, dimensions: int):
+        """
+        Opens the vector store, creating it if needed.
+        
+        Args:
+            persist_directory: Directory where the index and the sidecar table are stored
+            embed_query: Function returning the embedding of a text query
+            dimensions: Dimension of the vectors
+        """
+        os.makedirs(persist_directory, exist_ok=True)
+        self.embed_query = embed_query
+        self.dimensions = dimensions
+        self._index_path = os.path.join(persist_directory, self.INDEX_FILE)
+        self._lock = threading.Lock()
+        self._dirty = False
+        
+        self._conn = sqlite3.connect(os.path.join(persist_directory, self.DOCS_FILE), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "vector_id INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, text TEXT NOT NULL, metadata BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        
+        self._index_mtime = None
+        self._next_id = None
+        if os.path.exists(self._index_path):
+            self._open_saved_index()
+        else:
+            self._index = self._new_index()
+            self._writable = True
+    
+    def _new_index(self) -> faiss.Index:
+        """Returns an empty HNSW index addressed by vector ID."""
+        return faiss.IndexIDMap2(faiss.IndexHNSWFlat(self.dimensions, HNSW_M, faiss.METRIC_INNER_PRODUCT))
+    
+    def _open_saved_index(self):
+        """Memory-maps the saved index for searching; call with _lock held, or from __init__."""
+        self._index_mtime = os.stat(self._index_path).st_mtime_ns
+        self._index = faiss.read_index(self._index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        self._writable = False
+    
+    def _ensure_writable(self):
+        """Loads the saved index in full and finds the next free vector ID; call with _lock held."""
+        if not self._writable:
+            self._index = faiss.read_index(self._index_path)
+            self._writable = True
+        
+        if self._next_id is None:
+            # Vectors saved by a process that crashed before committing the
+            # sidecar have no row, so take the highest ID of either
+            index_ids = faiss.vector_to_array(self._index.id_map)
+            max_row = self._conn.execute("SELECT MAX(vector_id) FROM docs").fetchone()[0]
+            self._next_id = max(
+                int(index_ids.max()) + 1 if len(index_ids) else 0,
+                max_row + 1 if max_row is not None else 0
+            )
+    
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+               metadatas: List[Dict[str, Any]]):
+        """
+        Adds documents with their vectors, replacing the documents with the same IDs.
+        
+        The changes become visible to other processes on persist().
+        
+        Args:
+            ids: IDs of the documents
+            embeddings: Vectors of the documents
+            documents: Texts of the documents
+            metadatas: Metadata of the documents
+        """
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self.dimensions)
+        
+        with self._lock:
+            self._ensure_writable()
+            
+            vector_ids = np.arange(self._next_id, self._next_id + len(ids), dtype=np.int64)
+            # Left uncommitted; persist() commits it together with the index
+            self._conn.executemany("DELETE FROM docs WHERE id = ?", [(doc_id,) for doc_id in ids])
+            self._conn.executemany(
+                "INSERT INTO docs (vector_id, id, text, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (int(vector_id), doc_id, text, orjson.dumps(metadata or {}))
+                    for vector_id, doc_id, text, metadata in zip(vector_ids, ids, documents, metadatas)
+                ]
+            )
+            self._index.add_with_ids(vectors, vector_ids)
+            self._next_id += len(ids)
+            self._dirty = True
+    
+    def _compact(self, live_ids: np.ndarray):
+        """Rebuilds the index from the vectors that still belong to a document; call with _lock held."""
+        compacted = self._new_index()
+        if len(live_ids):
+            compacted.add_with_ids(self._index.reconstruct_batch(live_ids), live_ids)
+        self._index = compacted
+    
+    def persist(self):
+        """
+        Writes the index to disk and commits the sidecar, if documents were added since the last save.
+        
+        The index is compacted first once enough of its vectors were replaced.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            
+            live_ids = np.fromiter(
+                (vector_id for vector_id, in self._conn.execute("SELECT vector_id FROM docs")), dtype=np.int64
+            )
+            orphans = self._index.ntotal - len(live_ids)
+            if orphans >= COMPACT_MIN_ORPHANS and orphans >= COMPACT_ORPHAN_RATIO * self._index.ntotal:
+                self._compact(live_ids)
+            
+            tmp_path = self._index_path + ".tmp"
+            faiss.write_index(self._index, tmp_path)
+            os.replace(tmp_path, self._index_path)
+            self._conn.commit()
+            self._index_mtime = os.stat(self._index_path).st_mtime_ns
+            self._dirty = False
+    
+    def count(self) -> int:
+        """Returns the number of documents in the store."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+    
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 5) -> List[Tuple[Document, float]]:
+        """
+        Returns the k documents closest to a vector, with their distances.
+        
+        Args:
+            embedding: Query vector
+            k: Number of documents to return
+        
+        Returns:
+            List of tuples (document, score)
+        """
+        query = np.ascontiguousarray([embedding], dtype=np.float32)
+        
+        with self._lock:
+            # Pick up an index saved by another process (the ingest)
+            if not self._writable and os.path.exists(self._index_path):
+                if os.stat(self._index_path).st_mtime_ns != self._index_mtime:
+                    self._open_saved_index()
+            
+            live = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            # Over-fetch by the number of replaced vectors, which resolve to no
+            # document; compaction keeps them a bounded share of the index
+            fetch = min(self._index.ntotal, k + max(0, self._index.ntotal - live))
+            if fetch <= 0:
+                return []
+            sims, vector_ids = self._index.search(query, fetch)
+            
+            hits = [(int(vector_id), float(sim)) for vector_id, sim in zip(vector_ids[0], sims[0]) if vector_id >= 0]
+            rows = {
+                vector_id: (text, metadata)
+                for vector_id, text, metadata in self._conn.execute(
+                    f"SELECT vector_id, text, metadata FROM docs WHERE vector_id IN ({','.join('?' * len(hits))})",
+                    [vector_id for vector_id, _ in hits]
+                )
+            } if hits else {}
+        
+        results = []
+        for vector_id, sim in hits:
+            row = rows.get(vector_id)
+            if row is None:
+                continue
+            results.append((Document(page_content=row[0], metadata=orjson.loads(row[1])), 2.0 - 2.0 * sim))
+            if len(results) == k:
+                break
+        return results
+    
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 5) -> List[Document]:
+        """Returns the k documents closest to a vector."""
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k)]
+    
+    def similarity_search_with_score(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
+        """Returns the k documents closest to a text query, with their distances."""
+        return self.similarity_search_by_vector_with_score(self.embed_query(query), k=k)
+    
+    def similarity_search(self, query: str, k: int = 5) -> List[Document]:
+        """Returns the k documents closest to a text query."""
+        return self.similarity_search_by_vector(self.embed_query(query), k=k)
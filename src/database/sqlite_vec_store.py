@@ -0,0 +1,245 @@
+"""
+Vector store kept in an SQLite database with the sqlite-vec extension.
+"""
+import os
+import re
+import sqlite3
+import threading
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+import orjson
+import sqlite_vec
+from langchain.docstore.document import Document
+
+# Keyword candidates fetched from the full-text index per requested result
+BM25_CANDIDATES_PER_RESULT = 4
+
+# Unscored searches of at most this many terms whose best BM25 match scores at
+# least BM25_SHORTCUT_SCORE are answered from the full-text index alone,
+# without embedding the query
+KEYWORD_QUERY_MAX_TERMS = 3
+BM25_SHORTCUT_SCORE = 10.0
+
+class SqliteVecStore:
+    """
+    Vector store keeping the documents and their vectors in one SQLite database.
+    
+    Texts and metadata live in the documents table, and vectors in the
+    document_vectors vec0 table under the same rowid. The store can share the
+    database file of the chat memory, so the whole application state is a
+    single file.
+    
+    Text queries are hybrid: the documents_fts FTS5 index supplies BM25
+    keyword candidates, which are ranked together with the nearest vectors.
+    Unscored searches for short keyword queries with a strong BM25 match skip
+    the embedding call.
+    
+    Scores are reported as squared L2 distances between normalized vectors,
+    like Chroma's default, so lower is better.
+    """
+    name = "sqlite-vec"
+    
+    def __init__(self, db_path: str, embed_query, dimensions: int):
+        """
+        Opens the vector store, creating its tables if needed.
+        
+        Args:
+            db_path: Path of the SQLite database
+            embed_query: Function returning the embedding of a text query
+            dimensions: Dimension of the vectors
+        """
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.embed_query = embed_query
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.enable_load_extension(True)
+        sqlite_vec.load(self._conn)
+        self._conn.enable_load_extension(False)
+        
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "rowid INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, text TEXT NOT NULL, metadata BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS document_vectors "
+            f"USING vec0(embedding float[{dimensions}] distance_metric=cosine)"
+        )
+        
+        has_fts = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents_fts'"
+        ).fetchone()
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts "
+            "USING fts5(text, content='documents', content_rowid='rowid')"
+        )
+        # Keep the external-content index in sync with the documents table
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN "
+            "INSERT INTO documents_fts (rowid, text) VALUES (new.rowid, new.text); END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN "
+            "INSERT INTO documents_fts (documents_fts, rowid, text) VALUES ('delete', old.rowid, old.text); END"
+        )
+        if not has_fts:
+            self._conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')")
+        self._conn.commit()
+    
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+               metadatas: List[Dict[str, Any]]):
+        """
+        Adds documents with their vectors in one transaction, replacing the documents with the same IDs.
+        
+        Args:
+            ids: IDs of the documents
+            embeddings: Vectors of the documents
+            documents: Texts of the documents
+            metadatas: Metadata of the documents
+        """
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self.dimensions)
+        
+        with self._lock, self._conn:
+            replaced = [
+                (rowid,) for rowid, in self._conn.execute(
+                    f"SELECT rowid FROM documents WHERE id IN ({','.join('?' * len(ids))})", ids
+                )
+            ] if ids else []
+            self._conn.executemany("DELETE FROM document_vectors WHERE rowid = ?", replaced)
+            self._conn.executemany("DELETE FROM documents WHERE rowid = ?", replaced)
+            
+            rows = []
+            for doc_id, text, metadata, vector in zip(ids, documents, metadatas, vectors):
+                cursor = self._conn.execute(
+                    "INSERT INTO documents (id, text, metadata) VALUES (?, ?, ?)",
+                    (doc_id, text, orjson.dumps(metadata or {}))
+                )
+                rows.append((cursor.lastrowid, vector.tobytes()))
+            self._conn.executemany("INSERT INTO document_vectors (rowid, embedding) VALUES (?, ?)", rows)
+    
+    def persist(self):
+        """Does nothing: every upsert is committed when it completes."""
+    
+    def count(self) -> int:
+        """Returns the number of documents in the store."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 5) -> List[Tuple[Document, float]]:
+        """
+        Returns the k documents closest to a vector, with their distances.
+        
+        Args:
+            embedding: Query vector
+            k: Number of documents to return
+        
+        Returns:
+            List of tuples (document, score)
+        """
+        query = np.asarray(embedding, dtype=np.float32).tobytes()
+        
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.text, d.metadata, v.distance "
+                "FROM (SELECT rowid, distance FROM document_vectors WHERE embedding MATCH ? AND k = ?) AS v "
+                "JOIN documents AS d ON d.rowid = v.rowid "
+                "ORDER BY v.distance",
+                (query, k)
+            ).fetchall()
+        
+        # Cosine distance is 1 - cos; squared L2 between unit vectors is 2 - 2cos
+        return [
+            (Document(page_content=text, metadata=orjson.loads(metadata)), 2.0 * distance)
+            for text, metadata, distance in rows
+        ]
+    
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 5) -> List[Document]:
+        """Returns the k documents closest to a vector."""
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k)]
+    
+    def _keyword_candidates(self, terms: List[str], limit: int) -> List[Tuple[int, float]]:
+        """Returns up to limit (rowid, BM25 score) pairs matching any of the terms, best first; call with _lock held."""
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        # bm25() is negative, more negative for better matches; flip it so higher is better
+        return [
+            (rowid, -score) for rowid, score in self._conn.execute(
+                "SELECT rowid, bm25(documents_fts) FROM documents_fts WHERE documents_fts MATCH ? "
+                "ORDER BY bm25(documents_fts) LIMIT ?",
+                (match, limit)
+            )
+        ]
+    
+    def _documents_by_rowid(self, rowids: List[int]) -> Dict[int, Document]:
+        """Returns the documents with the given rowids; call with _lock held."""
+        return {
+            rowid: Document(page_content=text, metadata=orjson.loads(metadata))
+            for rowid, text, metadata in self._conn.execute(
+                f"SELECT rowid, text, metadata FROM documents WHERE rowid IN ({','.join('?' * len(rowids))})", rowids
+            )
+        }
+    
+    def _hybrid_search_with_score(self, query: str, candidates: List[Tuple[int, float]],
+                                  k: int) -> List[Tuple[Document, float]]:
+        """Ranks the keyword candidates and the nearest vectors together by distance to the query embedding."""
+        embedding = np.asarray(self.embed_query(query), dtype=np.float32).tobytes()
+        
+        with self._lock:
+            distances = dict(self._conn.execute(
+                "SELECT rowid, distance FROM document_vectors WHERE embedding MATCH ? AND k = ?", (embedding, k)
+            ).fetchall())
+            
+            keyword_rowids = [rowid for rowid, _ in candidates if rowid not in distances]
+            if keyword_rowids:
+                distances.update(self._conn.execute(
+                    "SELECT rowid, vec_distance_cosine(embedding, ?) FROM document_vectors "
+                    f"WHERE rowid IN ({','.join('?' * len(keyword_rowids))})",
+                    [embedding, *keyword_rowids]
+                ).fetchall())
+            
+            top = sorted(distances.items(), key=lambda item: item[1])[:k]
+            documents = self._documents_by_rowid([rowid for rowid, _ in top]) if top else {}
+        
+        # Cosine distance is 1 - cos; squared L2 between unit vectors is 2 - 2cos
+        return [(documents[rowid], 2.0 * distance) for rowid, distance in top if rowid in documents]
+    
+    def similarity_search_with_score(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
+        """
+        Returns the k documents that best match a text query, with their distances.
+        
+        BM25 keyword candidates and the nearest vectors are ranked together by
+        distance to the query embedding, so every score is on the same scale
+        as similarity_search_by_vector_with_score.
+        
+        Args:
+            query: Text query
+            k: Number of documents to return
+        
+        Returns:
+            List of tuples (document, score)
+        """
+        terms = re.findall(r"\w+", query)
+        with self._lock:
+            candidates = self._keyword_candidates(terms, k * BM25_CANDIDATES_PER_RESULT) if terms else []
+        return self._hybrid_search_with_score(query, candidates, k)
+    
+    def similarity_search(self, query: str, k: int = 5) -> List[Document]:
+        """
+        Returns the k documents that best match a text query.
+        
+        When a short query has a strong keyword match, the BM25 results are
+        returned directly, without embedding the query.
+        """
+        terms = re.findall(r"\w+", query)
+        
+        with self._lock:
+            candidates = self._keyword_candidates(terms, k * BM25_CANDIDATES_PER_RESULT) if terms else []
+            if (len(terms) <= KEYWORD_QUERY_MAX_TERMS and len(candidates) >= k
+                    and candidates[0][1] >= BM25_SHORTCUT_SCORE):
+                top = candidates[:k]
+                documents = self._documents_by_rowid([rowid for rowid, _ in top])
+                return [documents[rowid] for rowid, _ in top]
+        
+        return [doc for doc, _ in self._hybrid_search_with_score(query, candidates, k)]
@@ -2,96 +2,652 @@
 Vector store implementation for semantic search capabilities.
 """
 import os
-import sys
-from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+import re
+import asyncio
+import atexit
+import functools
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Union
 
-# Add the root directory to the Python PATH to allow relative imports when the script is executed directly
-current_dir = Path(os.path.dirname(os.path.realpath(__file__)))
-root_dir = current_dir.parent.parent
-if str(root_dir) not in sys.path:
-    sys.path.insert(0, str(root_dir))
+import numpy as np
+import orjson
+import tiktoken
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.docstore.document import Document
+from src.config.settings import (
+    VECTOR_STORE_DIR, VECTOR_STORE_BACKEND, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, DB_PATH, SEARCH_NGRAM_FILTER
+)
 
-from src.config.settings import VECTOR_STORE_DIR, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+# LangChain and the storage backends are imported where they are first used,
+# so importing this module (and the src.database package) stays cheap
+if TYPE_CHECKING:
+    from langchain_openai import OpenAIEmbeddings
+    from langchain.docstore.document import Document
+
+# Maximum number of keys per SELECT ... IN query on the embedding cache
+CACHE_LOOKUP_BATCH = 900
+
+# Limits of a single request to the embeddings endpoint
+EMBEDDING_MAX_BATCH = 2048
+EMBEDDING_MAX_TOKENS = 250_000
+
+# Tokenizer of the OpenAI embedding models, used to size the batches
+EMBEDDING_ENCODING = "cl100k_base"
+
+# Embedding requests in flight at once, and the random delay (in seconds)
+# before each one so that concurrent batches do not hit the API in lockstep
+EMBEDDING_MAX_WORKERS = 8
+EMBEDDING_REQUEST_JITTER = 0.2
+
+# Retries of an embedding request that was rate limited or failed transiently
+_embedding_retry = retry(
+    retry=retry_if_exception_type((RateLimitError, APIConnectionError, InternalServerError)),
+    wait=wait_exponential(multiplier=1, max=10),
+    stop=stop_after_attempt(3),
+    reraise=True
+)
+
+# Number of search queries whose embeddings are kept in memory
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+
+# Bloom filter of the character trigrams of every stored text; with
+# SEARCH_NGRAM_FILTER set, queries that share almost no trigram with the corpus
+# are answered without embedding them
+NGRAM_FILTER_FILE = "ngram_bloom.bin"
+NGRAM_FILTER_CAPACITY = 1_000_000
+NGRAM_FILTER_ERROR_RATE = 0.01
+NGRAM_SIZE = 3
+
+# Fraction of a query's trigrams that must be absent from the corpus for the
+# search to return no results
+OUT_OF_VOCABULARY_RATIO = 0.8
+
+# Seconds between status checks of an OpenAI Batch API job
+BATCH_POLL_INTERVAL = 60
+
+# Maximum number of rows per upsert into the Chroma collection
+ADD_BATCH_SIZE = 5000
+
+# Managers with documents added since they were last persisted; held weakly,
+# so short-lived managers can still be garbage collected
+_dirty_managers = weakref.WeakSet()
+
+@atexit.register
+def _flush_dirty_managers():
+    """Persists every manager with unsaved documents when the interpreter exits."""
+    for manager in list(_dirty_managers):
+        manager.flush()
 
 class VectorStoreManager:
-    def __init__(self, persist_directory: str = VECTOR_STORE_DIR):
+    def __init__(self, persist_directory: str = VECTOR_STORE_DIR, use_embedding_cache: bool = True,
+                 backend: str = VECTOR_STORE_BACKEND):
         """
         Initializes the vector database manager.
         
         Args:
-            persist_directory: Directory where the Chroma database will be stored
+            persist_directory: Directory where the vector database will be stored
+            use_embedding_cache: Reuse embeddings already computed for the same text,
+                stored in an SQLite cache next to the vector database
+            backend: Storage engine of the vector database, "chroma", "faiss", or
+                "sqlite-vec" (stored in the chat memory database)
+        """
+        if backend not in ("chroma", "faiss", "sqlite-vec"):
+            raise ValueError(f"Unsupported vector store backend: {backend}")
+        
+        self.persist_directory = persist_directory
+        self.use_embedding_cache = use_embedding_cache
+        self.backend = backend
+        
+        # The embedding function, the vector database, and the persistent embedding
+        # cache are created on first use, so callers that only need one of them
+        # do not pay for the others
+        self._embedding_function = None
+        self._embedding_client = None
+        self._async_embedding_client = None
+        self._vector_store = None
+        self._cache = None
+        self._cache_lock = threading.Lock()
+        
+        # Trigram filter updated by this manager's adds; False when the database
+        # predates it, so it cannot cover every stored text
+        self._ngram_filter = None
+        self._ngram_filter_dirty = False
+        
+        # Trigram filter used to gate searches, always read from disk and
+        # reloaded when another process (the ingest) rewrites the file
+        self._search_filter = None
+        self._search_filter_mtime = None
+        
+        # Adds only mark the database as dirty; it is persisted once, on flush()
+        # or when the interpreter exits
+        self._dirty = False
+        
+        # Memoized query embeddings, per manager so the cache does not keep
+        # every manager alive the way a class-level lru_cache would
+        self._cached_query_embedding = functools.lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)(
+            self._embed_query_uncached
+        )
+    
+    @property
+    def vector_store(self):
+        """Chroma database, FAISS store, or sqlite-vec store, depending on the backend, created on first access."""
+        if self._vector_store is None:
+            # Ensure the directory exists
+            os.makedirs(self.persist_directory, exist_ok=True)
+            
+            if self.backend == "faiss":
+                from src.database.faiss_store import FaissVectorStore
+                
+                self._vector_store = FaissVectorStore(
+                    persist_directory=self.persist_directory,
+                    embed_query=self._embed_query,
+                    dimensions=EMBEDDING_DIMENSIONS
+                )
+            elif self.backend == "sqlite-vec":
+                from src.database.sqlite_vec_store import SqliteVecStore
+                
+                self._vector_store = SqliteVecStore(
+                    db_path=DB_PATH,
+                    embed_query=self._embed_query,
+                    dimensions=EMBEDDING_DIMENSIONS
+                )
+            else:
+                from langchain_community.vectorstores import Chroma
+                
+                self._vector_store = Chroma(
+                    persist_directory=self.persist_directory,
+                    embedding_function=self.embedding_function,
+                )
+        return self._vector_store
+    
+    @property
+    def embedding_function(self) -> "OpenAIEmbeddings":
+        """OpenAI embedding function for the configured model, created on first access."""
+        if self._embedding_function is None:
+            from langchain_openai import OpenAIEmbeddings
+            
+            self._embedding_function = OpenAIEmbeddings(
+                model=EMBEDDING_MODEL,
+                dimensions=EMBEDDING_DIMENSIONS
+            )
+        return self._embedding_function
+    
+    def _embed_query_uncached(self, query: str) -> np.ndarray:
+        """Embeds a search query; the array is read-only since the cache shares it between callers."""
+        embedding = np.asarray(self.embedding_function.embed_query(query), dtype=np.float32)
+        embedding.flags.writeable = False
+        return embedding
+    
+    def _embed_query(self, query: str) -> List[float]:
+        """Returns the embedding of a search query, computed once per distinct query."""
+        return self._cached_query_embedding(query).tolist()
+    
+    @property
+    def embedding_client(self) -> OpenAI:
+        """OpenAI client used to request embeddings in batches, created on first access."""
+        if self._embedding_client is None:
+            self._embedding_client = OpenAI()
+        return self._embedding_client
+    
+    @property
+    def async_embedding_client(self) -> AsyncOpenAI:
+        """Asynchronous OpenAI client used to request embeddings in batches, created on first access."""
+        if self._async_embedding_client is None:
+            self._async_embedding_client = AsyncOpenAI()
+        return self._async_embedding_client
+    
+    def _embedding_batches(self, texts: List[str]) -> List[List[str]]:
+        """
+        Splits texts into consecutive batches for the embeddings endpoint.
+        
+        Batches are filled greedily, in order, up to EMBEDDING_MAX_BATCH inputs
+        and EMBEDDING_MAX_TOKENS tokens each.
+        
+        Args:
+            texts: List of strings to embed
+            
+        Returns:
+            List of batches of texts
         """
-        # Ensure the directory exists
-        os.makedirs(persist_directory, exist_ok=True)
+        token_counts = map(len, tiktoken.get_encoding(EMBEDDING_ENCODING).encode_ordinary_batch(texts))
         
-        # Configure OpenAI embeddings using the specified model
-        self.embedding_function = OpenAIEmbeddings(
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for text, tokens in zip(texts, token_counts):
+            if batch and (len(batch) == EMBEDDING_MAX_BATCH or batch_tokens + tokens > EMBEDDING_MAX_TOKENS):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    @_embedding_retry
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embeds one batch of texts with a single embeddings request."""
+        response = self.embedding_client.embeddings.create(
             model=EMBEDDING_MODEL,
+            input=batch,
             dimensions=EMBEDDING_DIMENSIONS
         )
-        
-        # Initialize the Chroma database
-        self.vector_store = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=self.embedding_function,
+        return [d.embedding for d in response.data]
+    
+    @_embedding_retry
+    async def _aembed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Asynchronously embeds one batch of texts with a single embeddings request."""
+        response = await self.async_embedding_client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=batch,
+            dimensions=EMBEDDING_DIMENSIONS
         )
+        return [d.embedding for d in response.data]
+    
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts in token-aware batches, with up to EMBEDDING_MAX_WORKERS
+        requests in flight at once.
+        
+        Args:
+            texts: List of strings to embed
+            
+        Returns:
+            List of embedding vectors, in the order of texts
+        """
+        batches = self._embedding_batches(texts)
+        if len(batches) <= 1:
+            return self._embed_batch(batches[0]) if batches else []
+        
+        def embed(batch):
+            time.sleep(random.uniform(0, EMBEDDING_REQUEST_JITTER))
+            return self._embed_batch(batch)
+        
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=min(EMBEDDING_MAX_WORKERS, len(batches))) as executor:
+            futures = []
+            start = 0
+            for batch in batches:
+                futures.append((start, executor.submit(embed, batch)))
+                start += len(batch)
+            
+            for start, future in futures:
+                embeddings = future.result()
+                results[start:start + len(embeddings)] = embeddings
+        return results
+    
+    async def _aembed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Asynchronously embeds texts in token-aware batches, with up to
+        EMBEDDING_MAX_WORKERS requests in flight at once.
+        
+        Args:
+            texts: List of strings to embed
+            
+        Returns:
+            List of embedding vectors, in the order of texts
+        """
+        batches = await asyncio.to_thread(self._embedding_batches, texts)
+        if len(batches) <= 1:
+            return await self._aembed_batch(batches[0]) if batches else []
+        
+        semaphore = asyncio.Semaphore(EMBEDDING_MAX_WORKERS)
+        
+        async def embed(batch):
+            async with semaphore:
+                await asyncio.sleep(random.uniform(0, EMBEDDING_REQUEST_JITTER))
+                return await self._aembed_batch(batch)
+        
+        results = await asyncio.gather(*(embed(batch) for batch in batches))
+        return [embedding for embeddings in results for embedding in embeddings]
+    
+    def _get_cache(self) -> sqlite3.Connection:
+        """Returns the embedding cache connection, opening it on first use; call with _cache_lock held."""
+        if self._cache is None:
+            os.makedirs(self.persist_directory, exist_ok=True)
+            
+            # Persistent embedding cache keyed by SHA-256(model|dimensions|text)
+            self._cache = sqlite3.connect(
+                os.path.join(self.persist_directory, "embedding_cache.sqlite3"), check_same_thread=False
+            )
+            self._cache.execute("PRAGMA journal_mode=WAL")
+            self._cache.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache (key TEXT PRIMARY KEY, vec BLOB NOT NULL)"
+            )
+            self._cache.commit()
+        return self._cache
+    
+    def _cache_keys(self, texts: List[str]) -> List[str]:
+        """Returns the embedding cache key of each text."""
+        prefix = f"{EMBEDDING_MODEL}|{EMBEDDING_DIMENSIONS}|"
+        return [hashlib.sha256((prefix + text).encode('utf-8')).hexdigest() for text in texts]
+    
+    def _cache_lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Returns the cached embeddings found for the given keys."""
+        found = {}
+        with self._cache_lock:
+            for start in range(0, len(keys), CACHE_LOOKUP_BATCH):
+                batch = keys[start:start + CACHE_LOOKUP_BATCH]
+                rows = self._get_cache().execute(
+                    f"SELECT key, vec FROM embedding_cache WHERE key IN ({','.join('?' * len(batch))})", batch
+                )
+                for key, vec in rows:
+                    found[key] = np.frombuffer(vec, dtype=np.float32).tolist()
+        return found
+    
+    def _cache_store(self, keys: List[str], embeddings: List[List[float]]):
+        """Saves newly generated embeddings in the cache."""
+        with self._cache_lock:
+            cache = self._get_cache()
+            cache.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, vec) VALUES (?, ?)",
+                [(key, np.asarray(embedding, dtype=np.float32).tobytes()) for key, embedding in zip(keys, embeddings)]
+            )
+            cache.commit()
+    
+    def _split_cached(self, texts: List[str]) -> tuple:
+        """Returns the cache keys, the cached embeddings, and the keys and texts still to embed."""
+        keys = self._cache_keys(texts)
+        cached = self._cache_lookup(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        return keys, cached, list(missing), list(missing.values())
     
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
         Generates embeddings for a list of texts using the configured embedding function.
         
+        Texts are sent to the embedding API in token-aware batches. When the
+        cache is enabled, only texts that were never embedded are sent.
+        
+        Args:
+            texts: List of strings to generate embeddings for
+            
+        Returns:
+            List of embedding vectors
+        """
+        if not self.use_embedding_cache:
+            return self._embed_texts(texts)
+        
+        keys, cached, missing_keys, missing_texts = self._split_cached(texts)
+        if missing_texts:
+            embeddings = self._embed_texts(missing_texts)
+            self._cache_store(missing_keys, embeddings)
+            cached.update(zip(missing_keys, embeddings))
+        return [cached[key] for key in keys]
+    
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Asynchronously generates embeddings for a list of texts.
+        
+        Texts are sent to the embedding API in token-aware batches. When the
+        cache is enabled, only texts that were never embedded are sent; cache
+        reads and writes run in a worker thread.
+        
         Args:
             texts: List of strings to generate embeddings for
             
         Returns:
             List of embedding vectors
         """
-        return self.embedding_function.embed_documents(texts)
+        if not self.use_embedding_cache:
+            return await self._aembed_texts(texts)
+        
+        keys, cached, missing_keys, missing_texts = await asyncio.to_thread(self._split_cached, texts)
+        if missing_texts:
+            embeddings = await self._aembed_texts(missing_texts)
+            await asyncio.to_thread(self._cache_store, missing_keys, embeddings)
+            cached.update(zip(missing_keys, embeddings))
+        return [cached[key] for key in keys]
+    
+    @staticmethod
+    def _ngrams(text: str) -> set:
+        """Returns the character trigrams of a text, after lowercasing it and collapsing non-word characters."""
+        text = " ".join(re.findall(r"\w+", text.lower()))
+        return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+    
+    def _get_ngram_filter(self):
+        """
+        Returns the trigram filter that adds are recorded in, loading or creating it on first use.
+        
+        A new filter is only started for an empty database, so that it always
+        covers every stored text; otherwise False is returned and nothing is
+        recorded. This filter never gates searches; see _get_search_filter.
+        """
+        if self._ngram_filter is None:
+            from pybloom_live import BloomFilter
+            
+            path = os.path.join(self.persist_directory, NGRAM_FILTER_FILE)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    self._ngram_filter = BloomFilter.fromfile(f)
+            elif self.get_collection_stats()["count"] == 0:
+                self._ngram_filter = BloomFilter(capacity=NGRAM_FILTER_CAPACITY, error_rate=NGRAM_FILTER_ERROR_RATE)
+            else:
+                self._ngram_filter = False
+        return self._ngram_filter
+    
+    def _get_search_filter(self):
+        """
+        Returns the saved trigram filter, reloading it when the file changed, or None if there is none.
+        
+        Only a filter written to disk after an ingest is used, so a filter
+        started in memory for a still-empty database never hides documents
+        that another process adds later.
+        """
+        from pybloom_live import BloomFilter
+        
+        path = os.path.join(self.persist_directory, NGRAM_FILTER_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._search_filter = self._search_filter_mtime = None
+            return None
+        
+        if mtime != self._search_filter_mtime:
+            with open(path, "rb") as f:
+                self._search_filter = BloomFilter.fromfile(f)
+            self._search_filter_mtime = mtime
+        return self._search_filter
+    
+    def _is_out_of_vocabulary(self, query: str) -> bool:
+        """Tells whether most trigrams of a query never occur in the stored texts; always False unless SEARCH_NGRAM_FILTER is set."""
+        if not SEARCH_NGRAM_FILTER:
+            return False
+        
+        grams = self._ngrams(query)
+        if not grams:
+            return False
+        search_filter = self._get_search_filter()
+        if search_filter is None:
+            return False
+        missing = sum(1 for gram in grams if gram not in search_filter)
+        return missing > OUT_OF_VOCABULARY_RATIO * len(grams)
     
-    def add_documents(self, documents: List[Document]):
+    def add_documents(self, documents: List["Document"]):
         """
         Adds documents to the vector database.
         
+        The documents are embedded in batches and then written in bulk
+        through add_documents_with_embeddings; call flush() to persist them.
+        
         Args:
             documents: List of documents to add to the database
         """
-        # Add documents to Chroma
-        self.vector_store.add_documents(documents)
-        
-        # Persist the database
-        self.vector_store.persist()
+        texts = [doc.page_content for doc in documents]
+        self.add_documents_with_embeddings(
+            texts, self.get_embeddings(texts), [doc.metadata for doc in documents]
+        )
     
-    def add_documents_with_embeddings(self, texts: List[str], embeddings: List[List[float]], 
-                                     metadatas: List[Dict[str, Any]]):
+    def _add_batch_size(self) -> int:
+        """Returns the number of rows per upsert: ADD_BATCH_SIZE, capped by the client's maximum batch size."""
+        if self.backend != "chroma":
+            return ADD_BATCH_SIZE
+        return min(ADD_BATCH_SIZE, self.vector_store._client.get_max_batch_size())
+    
+    def add_documents_with_embeddings(self, texts: List[str], embeddings: Union[np.ndarray, List[List[float]]], 
+                                     metadatas: List[Dict[str, Any]], ids: Optional[List[str]] = None,
+                                     flush: bool = False):
         """
         Adds documents with pre-calculated embeddings to the vector database.
         
+        Rows are upserted directly into the Chroma collection (or the FAISS or
+        sqlite-vec store) in slices of ADD_BATCH_SIZE, or the client's maximum batch size
+        if smaller, so the given vectors are stored as they are;
+        Chroma.add_texts would ignore them and embed the texts again. The
+        vectors are passed on as one float32 array, half the size of float64
+        and what every backend converts them to anyway.
+        
         Args:
             texts: List of document texts
-            embeddings: List of pre-calculated embedding vectors
+            embeddings: Pre-calculated embedding vectors, as an (N, D) array or a list of vectors
             metadatas: List of metadata associated with the documents
+            ids: Optional IDs of the rows; re-adding the same IDs replaces them
+            flush: Persist the database right after adding, instead of on flush()
         """
-        # Add to Chroma using pre-calculated embeddings
-        # Nota: alguns métodos antigos podem usar add_embeddings, outros add_texts
-        # Ambos executam a mesma função - adicionar textos com embeddings pré-calculados
-        self.vector_store.add_texts(
-            texts=texts,
-            metadatas=metadatas,
-            embeddings=embeddings
-        )
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in texts]
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        
+        # Record the trigrams before writing, while an empty database can still start a filter
+        ngram_filter = self._get_ngram_filter()
+        if ngram_filter and texts:
+            try:
+                for gram in set().union(*map(self._ngrams, texts)):
+                    ngram_filter.add(gram)
+                self._ngram_filter_dirty = True
+            except IndexError:
+                # The filter is full and can no longer cover every text; stop using it
+                self._ngram_filter = False
+                self._ngram_filter_dirty = False
+                path = os.path.join(self.persist_directory, NGRAM_FILTER_FILE)
+                if os.path.exists(path):
+                    os.remove(path)
+        
+        collection = self.vector_store._collection if self.backend == "chroma" else self.vector_store
+        batch_size = self._add_batch_size()
+        for start in range(0, len(texts), batch_size):
+            end = start + batch_size
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                documents=texts[start:end],
+                metadatas=metadatas[start:end]
+            )
+        
+        self._dirty = True
+        _dirty_managers.add(self)
+        if flush:
+            self.flush()
+    
+    async def add_documents_batch_api(self, texts: List[str], metadatas: List[Dict[str, Any]],
+                                      ids: Optional[List[str]] = None,
+                                      poll_interval: float = BATCH_POLL_INTERVAL) -> int:
+        """
+        Adds documents to the vector database, embedding them through the OpenAI Batch API.
+        
+        Meant for offline (re)indexing of large corpora: the job may take up to
+        24 hours but costs about half as much as the real-time endpoint. Texts
+        are sent in the same token-aware batches as get_embeddings, one batch
+        per request line, and texts already in the embedding cache are not sent.
+        
+        Args:
+            texts: List of document texts
+            metadatas: List of metadata associated with the documents
+            ids: Optional IDs of the rows; re-adding the same IDs replaces them
+            poll_interval: Seconds to wait between status checks of the job
+            
+        Returns:
+            Number of documents added
+        """
+        if self.use_embedding_cache:
+            keys, cached, missing_keys, missing_texts = await asyncio.to_thread(self._split_cached, texts)
+        else:
+            keys, cached, missing_keys, missing_texts = None, {}, None, texts
         
-        # Persist the database
+        embeddings = []
+        if missing_texts:
+            batches = await asyncio.to_thread(self._embedding_batches, missing_texts)
+            payload = b"".join(
+                orjson.dumps({
+                    "custom_id": str(i),
+                    "method": "POST",
+                    "url": "/v1/embeddings",
+                    "body": {"model": EMBEDDING_MODEL, "input": batch, "dimensions": EMBEDDING_DIMENSIONS}
+                }, option=orjson.OPT_APPEND_NEWLINE)
+                for i, batch in enumerate(batches)
+            )
+            
+            client = self.async_embedding_client
+            input_file = await client.files.create(file=("embeddings_batch.jsonl", payload), purpose="batch")
+            batch_job = await client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/embeddings",
+                completion_window="24h"
+            )
+            while batch_job.status in ("validating", "in_progress", "finalizing", "cancelling"):
+                await asyncio.sleep(poll_interval)
+                batch_job = await client.batches.retrieve(batch_job.id)
+            
+            if batch_job.status != "completed" or not batch_job.output_file_id:
+                raise RuntimeError(f"Embedding batch {batch_job.id} ended with status '{batch_job.status}'")
+            
+            # Output lines are not in input order; place each batch by its custom_id
+            output = await client.files.content(batch_job.output_file_id)
+            results = [None] * len(batches)
+            for line in output.content.splitlines():
+                row = orjson.loads(line)
+                response = row.get("response")
+                if row.get("error") or response is None or response["status_code"] != 200:
+                    raise RuntimeError(f"Embedding request {row['custom_id']} of batch {batch_job.id} failed")
+                results[int(row["custom_id"])] = [d["embedding"] for d in response["body"]["data"]]
+            
+            if any(result is None for result in results):
+                raise RuntimeError(f"Embedding batch {batch_job.id} returned incomplete results")
+            embeddings = [embedding for result in results for embedding in result]
+        
+        if self.use_embedding_cache:
+            if missing_texts:
+                await asyncio.to_thread(self._cache_store, missing_keys, embeddings)
+                cached.update(zip(missing_keys, embeddings))
+            embeddings = [cached[key] for key in keys]
+        
+        await asyncio.to_thread(self.add_documents_with_embeddings, texts, embeddings, metadatas, ids)
+        return len(texts)
+    
+    def persist(self):
+        """Persists the database (Chroma 0.4 and later also persist automatically) and the trigram filter."""
         self.vector_store.persist()
+        if self._ngram_filter_dirty:
+            path = os.path.join(self.persist_directory, NGRAM_FILTER_FILE)
+            with open(path + ".tmp", "wb") as f:
+                self._ngram_filter.tofile(f)
+            os.replace(path + ".tmp", path)
+            self._ngram_filter_dirty = False
+        self._dirty = False
+        _dirty_managers.discard(self)
     
-    def search(self, query: str, k: int = 5) -> List[Document]:
+    def flush(self):
+        """Persists the database if documents were added since it was last persisted."""
+        if self._dirty:
+            self.persist()
+    
+    def search(self, query: str, k: int = 5) -> List["Document"]:
         """
         Performs a semantic search in the database.
         
+        Query embeddings are memoized, so repeated queries skip the embedding API.
+        With SEARCH_NGRAM_FILTER set, queries sharing almost no trigram with the
+        stored texts return no documents without being embedded.
+        
         Args:
             query: Text query
             k: Number of documents to return
@@ -99,12 +655,20 @@ class VectorStoreManager:
         Returns:
             List of the most similar documents
         """
+        if self._is_out_of_vocabulary(query):
+            return []
+        if self.backend == "chroma":
+            return self.vector_store.similarity_search_by_vector(self._embed_query(query), k=k)
         return self.vector_store.similarity_search(query, k=k)
     
     def search_with_score(self, query: str, k: int = 5) -> List[tuple]:
         """
         Performs a semantic search and returns documents with their scores.
         
+        Query embeddings are memoized, so repeated queries skip the embedding API.
+        With SEARCH_NGRAM_FILTER set, queries sharing almost no trigram with the
+        stored texts return no documents without being embedded.
+        
         Args:
             query: Text query
             k: Number of documents to return
@@ -112,6 +676,10 @@ class VectorStoreManager:
         Returns:
             List of tuples (document, score)
         """
+        if self._is_out_of_vocabulary(query):
+            return []
+        if self.backend == "chroma":
+            return self.vector_store.similarity_search_by_vector_with_relevance_scores(self._embed_query(query), k=k)
         return self.vector_store.similarity_search_with_score(query, k=k)
     
     def get_collection_stats(self) -> Dict[str, Any]:
@@ -121,7 +689,7 @@ class VectorStoreManager:
         Returns:
             Dictionary with database statistics
         """
-        collection = self.vector_store._collection
+        collection = self.vector_store._collection if self.backend == "chroma" else self.vector_store
         return {
             "count": collection.count(),
             "collection_name": collection.name
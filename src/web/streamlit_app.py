@@ -2,21 +2,16 @@
 Streamlit interface for the LangGraph chatbot.
 """
 import os
-import sys
-import json
-import uuid
-import requests
-from pathlib import Path
+import secrets
+from typing import Any, List, Optional
+
 import streamlit as st
 
-# Add the root directory to the Python PATH
-current_dir = Path(os.path.dirname(os.path.realpath(__file__)))
-root_dir = current_dir.parent.parent
-if str(root_dir) not in sys.path:
-    sys.path.insert(0, str(root_dir))
+# Show raw API diagnostics in the sidebar only when diagnosing the client
+DEBUG = bool(os.environ.get("CHATBOT_DEBUG"))
 
-# Import the clear_agent_memory function to clear the database
-from src.database.chat_memory import clear_agent_memory
+# requests and the database module are imported inside the handlers that use
+# them, so reruns that only redraw the page do not wait for those imports
 
 # Configure the Streamlit page
 st.set_page_config(
@@ -29,12 +24,58 @@ st.set_page_config(
 def get_api_url():
     return os.environ.get("API_URL", "http://localhost:5000")
 
+@st.cache_resource
+def get_http_session():
+    """
+    Returns the HTTP session used for API calls, shared across reruns.
+    
+    Connections are kept alive in a small pool, and failed connections and
+    transient error statuses are retried with exponential backoff (POST
+    requests are only retried when the connection could not be made).
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_event_decoder():
+    """
+    Returns the typed decoder of the chat stream's events, built once per process.
+    
+    Events are decoded straight into structs, so the response does not need to
+    be checked field by field; a malformed event raises a validation error.
+    """
+    import msgspec
+    
+    class ResponseMessage(msgspec.Struct):
+        type: str
+        content: Any
+    
+    class StreamEvent(msgspec.Struct):
+        type: str
+        content: str = ""
+        error: str = "Unknown error"
+        response: List[ResponseMessage] = []
+        thread_id: Optional[str] = None
+    
+    return msgspec.json.Decoder(StreamEvent)
+
 # Initialize session state variables
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
 if "thread_id" not in st.session_state:
-    st.session_state.thread_id = str(uuid.uuid4())[:8]
+    st.session_state.thread_id = secrets.token_hex(8)
 
 # Application title
 st.title(":fox_face: ReAct RAG Chatbot")
@@ -42,8 +83,10 @@ st.title(":fox_face: ReAct RAG Chatbot")
 # Button to test API connection
 with st.sidebar:
     if st.button("Test API Connection"):
+        import requests
+        
         try:
-            response = requests.get(f"{get_api_url()}/health", timeout=5)
+            response = get_http_session().get(f"{get_api_url()}/health", timeout=5)
             if response.status_code == 200:
                 st.success(f"API available: {response.json().get('message', '')}")
             else:
@@ -72,64 +115,91 @@ if user_input:
         message_placeholder = st.empty()
         message_placeholder.markdown("Thinking...")
         
+        import requests
+        
         try:
-            # Send message to the API
-            api_url = f"{get_api_url()}/chat"
+            # Send message to the API and read the answer as it is generated
+            api_url = f"{get_api_url()}/chat/stream"
             
-            response = requests.post(
+            with get_http_session().post(
                 api_url,
                 json={"message": user_input, "thread_id": st.session_state.thread_id},
+                stream=True,
                 timeout=60
-            )
-            
-            # Debugging - display raw API response
-            st.sidebar.write("API status code:", response.status_code)
-            
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    
-                    # Update thread_id if provided
-                    if "thread_id" in data:
-                        st.session_state.thread_id = data["thread_id"]
-                    
-                    # Process response
-                    if "response" in data and isinstance(data["response"], list) and len(data["response"]) > 0:
-                        # Look only for assistant responses (type "ai")
-                        ai_responses = [msg for msg in data["response"] if isinstance(msg, dict) and msg.get("type") == "ai"]
+            ) as response:
+                # Debugging - display raw API response
+                if DEBUG:
+                    st.sidebar.write("API status code:", response.status_code)
+                
+                if response.status_code == 200:
+                    try:
+                        # Final and error events seen while streaming
+                        events = {}
+                        decoder = get_event_decoder()
+                        
+                        def stream_tokens():
+                            """Yields the answer tokens, keeping the final and error events."""
+                            # Server-sent events carry their JSON payload on "data:" lines
+                            for line in response.iter_lines(decode_unicode=True):
+                                if not line or not line.startswith("data: "):
+                                    continue
+                                
+                                event = decoder.decode(line[len("data: "):])
+                                if event.type == "token":
+                                    yield event.content
+                                elif event.type == "done":
+                                    events["done"] = event
+                                elif event.type == "error":
+                                    events["error"] = event.error
                         
-                        if ai_responses:
-                            # Use only the last assistant response
-                            bot_message = ai_responses[-1]["content"]
+                        # Render the tokens as they arrive
+                        streamed_text = message_placeholder.write_stream(stream_tokens())
+                        if not isinstance(streamed_text, str):
+                            streamed_text = "".join(map(str, streamed_text))
+                        done = events.get("done")
+                        stream_error = events.get("error")
+                        
+                        if stream_error:
+                            message_placeholder.markdown(f"❌ {stream_error}")
                         else:
-                            # If no response of type "ai", use the last response
-                            bot_response = data["response"][-1]
-                            if isinstance(bot_response, dict) and "content" in bot_response:
-                                bot_message = bot_response["content"]
+                            # Update thread_id if provided
+                            if done is not None and done.thread_id:
+                                st.session_state.thread_id = done.thread_id
+                            
+                            # Process response
+                            if done is not None and done.response:
+                                # Use only the last assistant response (type "ai"), searching from the end
+                                bot_message = next(
+                                    (msg.content for msg in reversed(done.response) if msg.type == "ai"),
+                                    None
+                                )
+                                
+                                if bot_message is None:
+                                    # If no response of type "ai", use the last response
+                                    bot_message = done.response[-1].content
+                            elif streamed_text:
+                                bot_message = streamed_text
                             else:
-                                bot_message = str(bot_response)
-                                st.sidebar.warning("Unexpected response format")
-                    else:
-                        bot_message = "I didn't receive a clear response. Please try again."
-                    
-                    # Show the response and update the history
-                    message_placeholder.markdown(bot_message)
-                    st.session_state.messages.append({"role": "assistant", "content": bot_message})
+                                bot_message = "I didn't receive a clear response. Please try again."
+                            
+                            # Show the response and update the history
+                            message_placeholder.markdown(bot_message)
+                            st.session_state.messages.append({"role": "assistant", "content": bot_message})
+                        
+                    except Exception as e:
+                        st.sidebar.error(f"Error processing streamed response: {e}")
+                        message_placeholder.markdown(f"❌ Error processing response: {str(e)}")
+                else:
+                    error_msg = f"API error: {response.status_code}"
+                    if response.text:
+                        try:
+                            error_data = response.json()
+                            if "error" in error_data:
+                                error_msg = error_data["error"]
+                        except:
+                            error_msg = f"API error: {response.text}"
                     
-                except Exception as e:
-                    st.sidebar.error(f"Error processing JSON response: {e}")
-                    message_placeholder.markdown(f"❌ Error processing response: {str(e)}")
-            else:
-                error_msg = f"API error: {response.status_code}"
-                if response.text:
-                    try:
-                        error_data = response.json()
-                        if "error" in error_data:
-                            error_msg = error_data["error"]
-                    except:
-                        error_msg = f"API error: {response.text}"
-                
-                message_placeholder.markdown(f"❌ {error_msg}")
+                    message_placeholder.markdown(f"❌ {error_msg}")
         
         except requests.exceptions.RequestException as e:
             message_placeholder.markdown(f"❌ Connection error: {str(e)}")
@@ -143,7 +213,7 @@ with st.sidebar:
     
     if st.button("New Conversation"):
         # Generate a new conversation ID
-        st.session_state.thread_id = str(uuid.uuid4())[:8]
+        st.session_state.thread_id = secrets.token_hex(8)
         st.session_state.messages = []
         st.rerun()
     
@@ -156,11 +226,9 @@ with st.sidebar:
     
     # Clear session state and agent memory if necessary
     if st.button("Clear Session Cache"):
-        # Save thread_id before clearing the cache to use it for clearing agent memory
-        thread_id = st.session_state.thread_id if "thread_id" in st.session_state else None
-
+        from src.database.chat_memory import clear_agent_memory
+        
         records_removed = clear_agent_memory()
         st.success(f"Session cache and agent memory cleared! ({records_removed} records removed from the database)")
-
-            
+        
         st.rerun()
\ No newline at end of file